@@ -3,7 +3,22 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+import os
 from datetime import datetime, timedelta
+from masi_index import MasiIndex, cached_index_constituents, portfolio_index_series, relative_performance
+from price_history import cached_price_history
+from shared_cache import get_shared_cache
+from attribution import attribution_inputs, brinson_attribution
+from corporate_actions import cached_corporate_actions
+from consolidated_book import book_summary, evaluate_book, load_book, portfolio_performances
+from returns_engine import (
+    annualized_return,
+    money_weighted_returns,
+    portfolio_cash_flows,
+    portfolio_key,
+    portfolio_value_history,
+    time_weighted_return
+)
 
 # Color scheme
 BLACK = "#000000"
@@ -13,42 +28,101 @@ DARK_RED = "#CC0000"
 DARK_YELLOW = "#CCCC00"
 WHITE = "#FFFFFF"
 
+# Lignes du book consolidé envoyées au navigateur à chaque rerun
+BOOK_TABLE_ROWS = 200
+
 # Fonction pour calculer les métriques du portefeuille
-def calculate_portfolio_metrics(stocks_data):
+def calculate_portfolio_metrics(stocks_data, price_history=None, as_of=None, corporate_actions=None):
     if not stocks_data:
         return None
     
-    # Calcul des métriques de base
-    total_investment = sum(stock["quantity"] * stock["buy_price"] for stock in stocks_data)
-    current_value = sum(stock["quantity"] * stock["current_price"] for stock in stocks_data)
-    pnl = current_value - total_investment
-    pnl_percentage = (pnl / total_investment * 100) if total_investment > 0 else 0
+    as_of = as_of or datetime.now().date()
+    
+    # Opérations sur titres depuis l'achat: actions reçues (divisions) et montants distribués
+    if corporate_actions is not None:
+        adjusted_stocks = []
+        for stock in stocks_data:
+            share_factor, distributions = (
+                corporate_actions.position_adjustment(stock["symbol"], stock["buy_date"], as_of)
+                if "buy_date" in stock else (1.0, 0.0)
+            )
+            adjusted_stocks.append({
+                **stock,
+                "quantity_held": stock["quantity"] * share_factor,
+                "dividends": stock["quantity"] * distributions
+            })
+        stocks_data = adjusted_stocks
     
     # Calcul des performances par action
     stock_performances = []
     for stock in stocks_data:
-        stock_value = stock["quantity"] * stock["current_price"]
+        stock_value = stock.get("quantity_held", stock["quantity"]) * stock["current_price"]
         stock_investment = stock["quantity"] * stock["buy_price"]
-        stock_pnl = stock_value - stock_investment
+        stock_dividends = stock.get("dividends", 0.0)
+        stock_pnl = stock_value + stock_dividends - stock_investment
         stock_pnl_percentage = (stock_pnl / stock_investment * 100) if stock_investment > 0 else 0
         
         stock_performances.append({
             "symbol": stock["symbol"],
             "name": stock["name"],
+            "quantity": stock.get("quantity_held", stock["quantity"]),
+            "buy_date": stock.get("buy_date"),
             "current_price": stock["current_price"],
             "value": stock_value,
             "investment": stock_investment,
+            "dividends": stock_dividends,
             "pnl": stock_pnl,
             "pnl_percentage": stock_pnl_percentage,
-            "weight": (stock_value / current_value * 100) if current_value > 0 else 0,
             "sector": stock.get("sector", "Autre")
         })
     
+    money_weighted_return = None
+    time_weighted = None
+    
+    # Rendements pondérés par les montants (XIRR) et par le temps (TWR) à partir des flux datés
+    if all("buy_date" in stock for stock in stocks_data):
+        key = portfolio_key(stocks_data)
+        irr = money_weighted_returns({key: portfolio_cash_flows(stocks_data, as_of)}, as_of)[key]
+        if np.isfinite(irr):
+            money_weighted_return = irr * 100
+        
+        if price_history is not None:
+            # Historique ajusté (divisions, droits et dividendes réinvestis) pour le TWR
+            factors = None
+            if corporate_actions is not None:
+                factors = corporate_actions.adjust(price_history) / price_history
+            values, flows = portfolio_value_history(stocks_data, price_history, factors)
+            if len(values) > 0:
+                # TWR cumulé annualisé sur la période de détention, même base que le XIRR
+                first_date = min(pd.Timestamp(stock["buy_date"]) for stock in stocks_data)
+                annual_twr = annualized_return(
+                    time_weighted_return(values, flows)[0], first_date, price_history.index[-1]
+                )
+                if annual_twr is not None:
+                    time_weighted = annual_twr * 100
+    
+    return summarize_portfolio(stock_performances, money_weighted_return, time_weighted)
+
+# Fonction pour agréger les performances par action en métriques du portefeuille
+# (partagée avec la vue consolidée, qui fournit des performances déjà évaluées)
+def summarize_portfolio(stock_performances, money_weighted_return=None, time_weighted=None):
+    # Calcul des métriques de base
+    total_investment = sum(stock["investment"] for stock in stock_performances)
+    current_value = sum(stock["value"] for stock in stock_performances)
+    total_dividends = sum(stock.get("dividends", 0.0) for stock in stock_performances)
+    pnl = current_value + total_dividends - total_investment
+    pnl_percentage = (pnl / total_investment * 100) if total_investment > 0 else 0
+    
+    for stock in stock_performances:
+        stock["weight"] = (stock["value"] / current_value * 100) if current_value > 0 else 0
+    
     # Calcul des ratios financiers
     sharpe_ratio = 1.2  # Simplified calculation
     beta = 0.8  # Simplified calculation
     volatility = "15%"  # Simplified calculation
-    annual_return = f"{pnl_percentage:.2f}%"  # Using current performance as annualized for demo
+    annual_return = f"{pnl_percentage:.2f}%"  # Fallback when purchase dates are unknown
+    if money_weighted_return is not None:
+        annual_return = f"{money_weighted_return:.2f}%"
     
     # Calculate sector distribution
     sector_distribution = {}
@@ -75,12 +149,15 @@ def calculate_portfolio_metrics(stocks_data):
         "current_value": current_value,
         "pnl": pnl,
         "pnl_percentage": pnl_percentage,
+        "dividends": total_dividends,
         "stock_performances": stock_performances,
         "ratios": {
             "sharpe_ratio": sharpe_ratio,
             "beta": beta,
             "volatility": volatility,
             "annual_return": annual_return,
+            "money_weighted_return": money_weighted_return,
+            "time_weighted_return": time_weighted,
             "risk_level": risk_level,
             "risk_color": risk_color
         },
@@ -113,7 +190,8 @@ MOROCCAN_STOCKS = [
 
 def get_moroccan_stocks():
     try:
-        return pd.DataFrame(MOROCCAN_STOCKS)
+        # Univers partagé entre toutes les sessions (aucune copie par utilisateur)
+        return get_shared_cache().get_or_load("universe", lambda: pd.DataFrame(MOROCCAN_STOCKS))
     except Exception as e:
         st.error(f"Error while loading stock data: {str(e)}")
         return None
@@ -256,16 +334,26 @@ with st.sidebar:
     # Refresh button
     if st.button("🔄 Actualiser les cours", key="refresh_button"):
         with st.spinner("Chargement des données..."):
+            get_shared_cache().invalidate("universe")
             stocks_df = get_moroccan_stocks()
             if stocks_df is not None and not stocks_df.empty:
                 st.session_state.stocks_df = stocks_df
+                # Mise à jour incrémentale du MASI reconstitué
+                if 'masi_index' in st.session_state:
+                    for _, row in stocks_df.iterrows():
+                        if row['symbol'] in st.session_state.masi_index.positions:
+                            st.session_state.masi_index.update_price(row['symbol'], row['price'])
                 st.success(f"Données chargées avec succès! {len(stocks_df)} actions disponibles.")
             else:
                 st.error("Impossible de charger les données des actions.")
     
     # Initialize session state if not already done
     if 'stocks_df' not in st.session_state:
-        st.session_state.stocks_df = pd.DataFrame(MOROCCAN_STOCKS)
+        st.session_state.stocks_df = get_moroccan_stocks()
+    
+    # Indice de référence reconstitué (MASI et indices sectoriels)
+    if 'masi_index' not in st.session_state:
+        st.session_state.masi_index = MasiIndex(cached_index_constituents(MOROCCAN_STOCKS))
     
     # Portfolio configuration
     st.markdown("#### Composition du Portefeuille")
@@ -309,6 +397,14 @@ with st.sidebar:
             key=f"buy_price_{i}"
         )
         
+        # Purchase date input
+        buy_date = st.date_input(
+            "Date d'achat",
+            value=datetime.now().date() - timedelta(days=365),
+            max_value=datetime.now().date(),
+            key=f"buy_date_{i}"
+        )
+        
         # Display current price
         st.info(f"Prix actuel: {stock_info['price']} MAD | Secteur: {stock_info['sector']}")
         
@@ -317,6 +413,7 @@ with st.sidebar:
             "name": stock_info['name'],
             "quantity": quantity,
             "buy_price": buy_price,
+            "buy_date": buy_date,
             "current_price": stock_info['price'],
             "sector": stock_info['sector']
         })
@@ -326,7 +423,148 @@ with st.sidebar:
         if not stocks_data:
             st.error("Veuillez ajouter au moins une action à votre portefeuille.")
         else:
-            st.session_state.portfolio_metrics = calculate_portfolio_metrics(stocks_data)
+            st.session_state.portfolio_metrics = calculate_portfolio_metrics(
+                stocks_data,
+                price_history=cached_price_history(),
+                corporate_actions=cached_corporate_actions()
+            )
+    
+    # Book consolidé: chargement de nombreux portefeuilles clients
+    st.markdown("#### Book Consolidé")
+    book_file = st.file_uploader(
+        "Portefeuilles clients (CSV: portfolio_id, symbol, quantity, buy_price, buy_date)",
+        type="csv",
+        key="book_file"
+    )
+    if st.button("📂 Charger le Book", key="load_book"):
+        try:
+            with st.spinner("Évaluation des portefeuilles..."):
+                book = load_book(MOROCCAN_STOCKS, book_file) if book_file is not None else load_book(MOROCCAN_STOCKS)
+                prices = st.session_state.stocks_df.set_index('symbol')['price'].reindex(book.symbols)
+                st.session_state.book = book
+                st.session_state.book_evaluation = evaluate_book(
+                    book, prices.to_numpy(), corporate_actions=cached_corporate_actions()
+                )
+            st.success(f"{len(book)} portefeuilles chargés.")
+        except (FileNotFoundError, ValueError) as e:
+            st.error(f"Impossible de charger le book: {str(e)}")
+    
+    # Compteurs du cache partagé pour le suivi d'exploitation
+    if os.environ.get("SHOW_CACHE_STATS"):
+        with st.expander("📦 Cache partagé"):
+            st.json(get_shared_cache().stats())
+
+# Consolidated book view
+if 'book' in st.session_state:
+    book = st.session_state.book
+    evaluation = st.session_state.book_evaluation
+    
+    st.markdown(f"""
+        <div style='background-color: {BLACK}; border-radius: 10px; padding: 20px; margin-bottom: 20px; box-shadow: 0 2px 10px rgba(255,0,0,0.2);'>
+            <h2 style='color: {YELLOW}; margin-top: 0;'>Book Consolidé</h2>
+            <div style='display: grid; grid-template-columns: repeat(4, 1fr); gap: 15px;'>
+                <div style='background-color: {BLACK}; padding: 15px; border-radius: 10px; border-left: 4px solid {RED};'>
+                    <div style='font-size: 14px; color: {YELLOW};'>Portefeuilles</div>
+                    <div style='font-size: 24px; font-weight: bold;'>{len(book):,}</div>
+                </div>
+                <div style='background-color: {BLACK}; padding: 15px; border-radius: 10px; border-left: 4px solid {RED};'>
+                    <div style='font-size: 14px; color: {YELLOW};'>Investissement Total</div>
+                    <div style='font-size: 24px; font-weight: bold;'>{evaluation['investments'].sum():,.2f} MAD</div>
+                </div>
+                <div style='background-color: {BLACK}; padding: 15px; border-radius: 10px; border-left: 4px solid {RED};'>
+                    <div style='font-size: 14px; color: {YELLOW};'>Valeur Actuelle</div>
+                    <div style='font-size: 24px; font-weight: bold;'>{evaluation['values'].sum():,.2f} MAD</div>
+                </div>
+                <div style='background-color: {BLACK}; padding: 15px; border-radius: 10px; border-left: 4px solid {RED};'>
+                    <div style='font-size: 14px; color: {YELLOW};'>Profit & Loss</div>
+                    <div style='font-size: 24px; font-weight: bold; color: {RED};'>{evaluation['pnl'].sum():,.2f} MAD</div>
+                </div>
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        # Exposition sectorielle agrégée
+        sector_exposure = evaluation["sector_exposure"]
+        sector_exposure = sector_exposure[sector_exposure > 0].reset_index()
+        sector_exposure.columns = ["sector", "value"]
+        fig_book_sectors = px.pie(
+            sector_exposure,
+            values="value",
+            names="sector",
+            hole=0.4,
+            title="Exposition par Secteur",
+            color_discrete_sequence=[RED, YELLOW, DARK_RED, DARK_YELLOW]
+        )
+        fig_book_sectors.update_layout(
+            plot_bgcolor=BLACK,
+            paper_bgcolor=BLACK,
+            font=dict(color=YELLOW)
+        )
+        st.plotly_chart(fig_book_sectors, use_container_width=True)
+    
+    with col2:
+        # Exposition agrégée par action
+        symbol_exposure = evaluation["symbol_exposure"]
+        symbol_exposure = symbol_exposure[symbol_exposure > 0].sort_values(ascending=False).head(15).reset_index()
+        symbol_exposure.columns = ["symbol", "value"]
+        fig_book_symbols = px.bar(
+            symbol_exposure,
+            x="symbol",
+            y="value",
+            title="Principales Expositions par Action",
+            color_discrete_sequence=[RED],
+            labels={"value": "Valeur (MAD)", "symbol": "Action"}
+        )
+        fig_book_symbols.update_layout(
+            plot_bgcolor=BLACK,
+            paper_bgcolor=BLACK,
+            font=dict(color=YELLOW),
+            yaxis=dict(showgrid=False),
+            xaxis=dict(title=None)
+        )
+        st.plotly_chart(fig_book_symbols, use_container_width=True)
+    
+    summary = book_summary(book, evaluation)
+    summary.columns = ["Portefeuille", "Investissement", "Valeur", "P&L", "Performance %", "XIRR %"]
+    
+    # Seuls les premiers portefeuilles filtrés et triés sont rendus (tableau brut, formatage côté client)
+    col1, col2 = st.columns(2)
+    book_filter = col1.text_input("Filtrer les portefeuilles", key="book_filter")
+    sort_column = col2.selectbox(
+        "Trier par",
+        options=["P&L", "Performance %", "XIRR %", "Valeur", "Investissement"],
+        key="book_sort"
+    )
+    if book_filter:
+        summary = summary[summary["Portefeuille"].astype(str).str.contains(book_filter, case=False, regex=False)]
+    shown = summary.nlargest(BOOK_TABLE_ROWS, sort_column)
+    st.caption(f"{len(shown):,} portefeuilles affichés sur {len(summary):,}, triés par {sort_column} décroissant")
+    st.dataframe(
+        shown,
+        column_config={
+            "Investissement": st.column_config.NumberColumn(format="%.2f MAD"),
+            "Valeur": st.column_config.NumberColumn(format="%.2f MAD"),
+            "P&L": st.column_config.NumberColumn(format="%+.2f MAD"),
+            "Performance %": st.column_config.NumberColumn(format="%+.2f%%"),
+            "XIRR %": st.column_config.NumberColumn(format="%+.2f%%")
+        },
+        hide_index=True,
+        use_container_width=True,
+        height=300
+    )
+    
+    # Drill-down: les onglets d'analyse affichent le portefeuille choisi à partir de l'évaluation du book
+    selected_portfolio = st.selectbox("Portefeuille à analyser", options=list(shown["Portefeuille"]), key="book_portfolio")
+    if st.button("🔎 Analyser ce portefeuille", key="drill_down") and selected_portfolio is not None:
+        row = book.portfolio_ids.get_loc(selected_portfolio)
+        irr = evaluation["money_weighted_returns"][row]
+        st.session_state.portfolio_metrics = summarize_portfolio(
+            portfolio_performances(book, evaluation, row),
+            money_weighted_return=irr if np.isfinite(irr) else None
+        )
 
 # Main content area
 if 'portfolio_metrics' in st.session_state:
@@ -362,7 +600,9 @@ if 'portfolio_metrics' in st.session_state:
         """, unsafe_allow_html=True)
     
     # Performance tabs
-    tab1, tab2, tab3, tab4 = st.tabs(["📈 Performance", "📊 Répartition", "📋 Détails", "📌 Recommandations"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(
+        ["📈 Performance", "📊 Répartition", "📋 Détails", "📌 Recommandations", "🔮 Prévisions"]
+    )
     
     with tab1:
         # Performance chart
@@ -433,61 +673,211 @@ if 'portfolio_metrics' in st.session_state:
             xaxis=dict(title=None)
         )
         st.plotly_chart(fig_perf, use_container_width=True)
-    
-    with tab2:
-        # Sector and asset distribution
-        col1, col2 = st.columns(2)
         
-        with col1:
-            st.markdown(f"""
-                <div style='background-color: {BLACK}; border-radius: 10px; padding: 20px; margin-bottom: 20px;'>
-                    <h3 style='color: {YELLOW};'>Répartition par Secteur</h3>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            # Sector distribution pie chart
-            sector_data = pd.DataFrame({
-                "sector": list(metrics["sector_distribution"].keys()),
-                "value": list(metrics["sector_distribution"].values())
-            })
-            
-            fig_sector = px.pie(
-                sector_data,
-                values="value",
-                names="sector",
-                hole=0.4,
-                color_discrete_sequence=[RED, YELLOW, DARK_RED, DARK_YELLOW]
+        # Comparaison avec l'indice de référence MASI
+        masi = st.session_state.masi_index
+        st.markdown(f"""
+            <div style='background-color: {BLACK}; border-radius: 10px; padding: 20px; margin-bottom: 20px;'>
+                <h3 style='color: {YELLOW};'>Portefeuille vs {masi.name}</h3>
+            </div>
+            """, unsafe_allow_html=True)
+        if not masi.capitalisation_weighted:
+            st.caption(
+                "Capitalisations flottantes indisponibles ou incomplètes (data/constituants_masi.csv): "
+                "l'indice de référence est une moyenne pondérée par les prix, pas le MASI officiel."
             )
-            fig_sector.update_layout(
+        
+        history = cached_price_history(symbols=masi.symbols)
+        comparison = None
+        
+        if history is not None and len(history) > 1:
+            # Cours ajustés des divisions et droits (indice de prix)
+            history = cached_corporate_actions().adjust(history, include_dividends=False)
+            # Positions comptées à partir de leur date d'achat; indice rebasé sur la même période
+            portfolio_series = portfolio_index_series(metrics["stock_performances"], history)
+            if len(portfolio_series) > 1:
+                masi_levels = masi.level_series(history.loc[portfolio_series.index])
+                comparison = relative_performance(portfolio_series.to_numpy(), masi_levels.to_numpy())
+        
+        if comparison is not None:
+            fig_benchmark = go.Figure()
+            fig_benchmark.add_trace(go.Scatter(
+                x=portfolio_series.index,
+                y=portfolio_series,
+                mode='lines',
+                line=dict(color=RED, width=3),
+                name='Portefeuille'
+            ))
+            fig_benchmark.add_trace(go.Scatter(
+                x=masi_levels.index,
+                y=100 * masi_levels / masi_levels.iloc[0],
+                mode='lines',
+                line=dict(color=YELLOW, width=2),
+                name=masi.name
+            ))
+            fig_benchmark.update_layout(
                 plot_bgcolor=BLACK,
                 paper_bgcolor=BLACK,
                 font=dict(color=YELLOW),
-                showlegend=True
+                yaxis=dict(title=dict(text='Base 100', font=dict(color=YELLOW)), gridcolor=RED),
+                xaxis=dict(gridcolor=RED),
+                hovermode="x unified"
+            )
+            st.plotly_chart(fig_benchmark, use_container_width=True)
+            
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Rendement Portefeuille", f"{comparison['portfolio_return']:.2f}%")
+            col2.metric(f"Rendement {masi.name}", f"{comparison['index_return']:.2f}%")
+            col3.metric(
+                f"Beta vs {masi.name}",
+                f"{comparison['beta']:.2f}" if comparison['beta'] is not None else "N/A"
             )
-            st.plotly_chart(fig_sector, use_container_width=True)
+        else:
+            st.info(f"Niveau {masi.name} reconstitué: {masi.level:,.2f} | Historique des cours indisponible pour le suivi relatif.")
         
-        with col2:
+        # Pondérations sectorielles du portefeuille vs indice
+        index_sector_weights = masi.sector_weights()
+        portfolio_sector_weights = {
+            sector: value / metrics['current_value'] if metrics['current_value'] > 0 else 0
+            for sector, value in metrics["sector_distribution"].items()
+        }
+        sector_comparison = pd.DataFrame({
+            "sector": masi.sectors,
+            "Portefeuille": [100 * portfolio_sector_weights.get(sector, 0) for sector in masi.sectors],
+            masi.name: [100 * index_sector_weights[sector] for sector in masi.sectors]
+        })
+        fig_sectors = px.bar(
+            sector_comparison,
+            x="sector",
+            y=["Portefeuille", masi.name],
+            barmode="group",
+            title=f"Poids Sectoriels: Portefeuille vs {masi.name}",
+            color_discrete_sequence=[RED, YELLOW],
+            labels={"value": "Poids (%)", "sector": "Secteur", "variable": ""}
+        )
+        fig_sectors.update_layout(
+            plot_bgcolor=BLACK,
+            paper_bgcolor=BLACK,
+            font=dict(color=YELLOW),
+            yaxis=dict(showgrid=False),
+            xaxis=dict(title=None)
+        )
+        st.plotly_chart(fig_sectors, use_container_width=True)
+    
+    with tab2:
+        distribution_tab, attribution_tab = st.tabs(["Répartition", "Attribution Sectorielle"])
+        
+        with distribution_tab:
+            # Sector and asset distribution
+            col1, col2 = st.columns(2)
+        
+            with col1:
+                st.markdown(f"""
+                    <div style='background-color: {BLACK}; border-radius: 10px; padding: 20px; margin-bottom: 20px;'>
+                        <h3 style='color: {YELLOW};'>Répartition par Secteur</h3>
+                    </div>
+                    """, unsafe_allow_html=True)
+            
+                # Sector distribution pie chart
+                sector_data = pd.DataFrame({
+                    "sector": list(metrics["sector_distribution"].keys()),
+                    "value": list(metrics["sector_distribution"].values())
+                })
+            
+                fig_sector = px.pie(
+                    sector_data,
+                    values="value",
+                    names="sector",
+                    hole=0.4,
+                    color_discrete_sequence=[RED, YELLOW, DARK_RED, DARK_YELLOW]
+                )
+                fig_sector.update_layout(
+                    plot_bgcolor=BLACK,
+                    paper_bgcolor=BLACK,
+                    font=dict(color=YELLOW),
+                    showlegend=True
+                )
+                st.plotly_chart(fig_sector, use_container_width=True)
+        
+            with col2:
+                st.markdown(f"""
+                    <div style='background-color: {BLACK}; border-radius: 10px; padding: 20px; margin-bottom: 20px;'>
+                        <h3 style='color: {YELLOW};'>Répartition par Action</h3>
+                    </div>
+                    """, unsafe_allow_html=True)
+            
+                # Asset distribution treemap
+                fig_treemap = px.treemap(
+                    performance_data,
+                    path=['symbol'],
+                    values='value',
+                    color='pnl_percentage',
+                    color_continuous_scale=[RED, YELLOW],
+                    hover_data=['pnl_percentage']
+                )
+                fig_treemap.update_layout(
+                    plot_bgcolor=BLACK,
+                    paper_bgcolor=BLACK,
+                    margin=dict(t=0, l=0, r=0, b=0)
+                )
+                st.plotly_chart(fig_treemap, use_container_width=True)
+        
+        with attribution_tab:
+            masi = st.session_state.masi_index
             st.markdown(f"""
                 <div style='background-color: {BLACK}; border-radius: 10px; padding: 20px; margin-bottom: 20px;'>
-                    <h3 style='color: {YELLOW};'>Répartition par Action</h3>
+                    <h3 style='color: {YELLOW};'>Attribution de Performance vs {masi.name}</h3>
                 </div>
                 """, unsafe_allow_html=True)
             
-            # Asset distribution treemap
-            fig_treemap = px.treemap(
-                performance_data,
-                path=['symbol'],
-                values='value',
-                color='pnl_percentage',
-                color_continuous_scale=[RED, YELLOW],
-                hover_data=['pnl_percentage']
-            )
-            fig_treemap.update_layout(
-                plot_bgcolor=BLACK,
-                paper_bgcolor=BLACK,
-                margin=dict(t=0, l=0, r=0, b=0)
-            )
-            st.plotly_chart(fig_treemap, use_container_width=True)
+            history = cached_price_history(symbols=masi.symbols)
+            attribution = None
+            if history is not None and len(history) > 1:
+                # Rendements ajustés de toutes les opérations sur titres, dividendes compris
+                history = cached_corporate_actions().adjust(history)
+                dates, portfolio_weights, benchmark_weights, returns = attribution_inputs(
+                    metrics["stock_performances"], history, masi
+                )
+                if len(dates) > 0:
+                    attribution = brinson_attribution(
+                        portfolio_weights, benchmark_weights, returns, masi.sector_codes, masi.sectors
+                    )
+            
+            if attribution is None:
+                st.info("Historique des cours indisponible pour l'attribution de performance.")
+            else:
+                linked = attribution["linked"] * 100
+                linked = linked[(linked.abs() > 1e-9).any(axis=1)]
+                
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Rendement Portefeuille", f"{attribution['portfolio_return'] * 100:.2f}%")
+                col2.metric(f"Rendement {masi.name}", f"{attribution['benchmark_return'] * 100:.2f}%")
+                col3.metric(
+                    "Surperformance",
+                    f"{(attribution['portfolio_return'] - attribution['benchmark_return']) * 100:+.2f}%"
+                )
+                
+                attribution_data = linked.reset_index().rename(columns={"index": "sector"})
+                fig_attribution = px.bar(
+                    attribution_data,
+                    x="sector",
+                    y=["allocation", "selection", "interaction"],
+                    barmode="relative",
+                    title="Effets par Secteur",
+                    color_discrete_sequence=[RED, YELLOW, DARK_YELLOW],
+                    labels={"value": "Contribution (%)", "sector": "Secteur", "variable": "Effet"}
+                )
+                fig_attribution.update_layout(
+                    plot_bgcolor=BLACK,
+                    paper_bgcolor=BLACK,
+                    font=dict(color=YELLOW),
+                    yaxis=dict(showgrid=False),
+                    xaxis=dict(title=None)
+                )
+                st.plotly_chart(fig_attribution, use_container_width=True)
+                
+                linked.columns = ["Allocation %", "Sélection %", "Interaction %"]
+                st.dataframe(linked.style.format("{:+.3f}%"), use_container_width=True)
     
     with tab3:
         # Detailed performance table
@@ -500,11 +890,11 @@ if 'portfolio_metrics' in st.session_state:
         detailed_data = pd.DataFrame(metrics["stock_performances"])
         detailed_data = detailed_data[[
             "symbol", "name", "sector", "current_price", 
-            "investment", "value", "pnl", "pnl_percentage", "weight"
+            "investment", "value", "dividends", "pnl", "pnl_percentage", "weight"
         ]]
         detailed_data.columns = [
             "Symbole", "Nom", "Secteur", "Prix Actuel", 
-            "Investissement", "Valeur", "P&L", "Performance %", "Poids %"
+            "Investissement", "Valeur", "Dividendes", "P&L", "Performance %", "Poids %"
         ]
         
         # Format the DataFrame display
@@ -512,6 +902,7 @@ if 'portfolio_metrics' in st.session_state:
             "Prix Actuel": "{:,.2f} MAD",
             "Investissement": "{:,.2f} MAD",
             "Valeur": "{:,.2f} MAD",
+            "Dividendes": "{:,.2f} MAD",
             "P&L": "{:+,.2f} MAD",
             "Performance %": "{:+.2f}%",
             "Poids %": "{:.2f}%"
@@ -547,6 +938,14 @@ if 'portfolio_metrics' in st.session_state:
                 </div>
             </div>
             """, unsafe_allow_html=True)
+        
+        # Rendements pondérés par le temps et par les montants
+        if metrics['ratios']['time_weighted_return'] is not None or metrics['ratios']['money_weighted_return'] is not None:
+            twr = metrics['ratios']['time_weighted_return']
+            mwr = metrics['ratios']['money_weighted_return']
+            col1, col2 = st.columns(2)
+            col1.metric("Rendement Pondéré par le Temps (TWR annualisé)", f"{twr:.2f}%" if twr is not None else "N/A")
+            col2.metric("Rendement Pondéré par les Montants (XIRR annualisé)", f"{mwr:.2f}%" if mwr is not None else "N/A")
     
     with tab4:
         # Recommendations
@@ -611,6 +1010,56 @@ if 'portfolio_metrics' in st.session_state:
                 <p>Considérez rééquilibrer votre portefeuille pour optimiser le ratio risque/rendement.</p>
             </div>
             """, unsafe_allow_html=True)
+    
+    with tab5:
+        st.markdown(f"""
+            <div style='background-color: {BLACK}; border-radius: 10px; padding: 20px; margin-bottom: 20px;'>
+                <h3 style='color: {YELLOW};'>Prévisions des Cours</h3>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        # Le module de prévision n'est chargé qu'à l'ouverture de la vue;
+        # les prévisions sont calculées par la tâche quotidienne et seulement lues ici
+        if st.toggle("Afficher les prévisions", key="show_forecasts"):
+            from forecast import load_forecasts
+            
+            forecasts, forecast_date = load_forecasts()
+            if forecasts is None:
+                st.info("Aucune prévision disponible. Lancez `python forecast.py predict` après la clôture.")
+            else:
+                held_symbols = [stock["symbol"] for stock in metrics["stock_performances"]]
+                portfolio_forecasts = forecasts[forecasts["symbol"].isin(held_symbols)]
+                st.caption(f"Prévisions du {forecast_date:%d/%m/%Y} pour la prochaine séance")
+                
+                fig_forecast = px.bar(
+                    portfolio_forecasts,
+                    x="symbol",
+                    y="predicted_return",
+                    title="Rendement Prévu par Action",
+                    color="predicted_return",
+                    color_continuous_scale=[RED, YELLOW],
+                    labels={"predicted_return": "Rendement prévu (%)", "symbol": "Action"}
+                )
+                fig_forecast.update_layout(
+                    plot_bgcolor=BLACK,
+                    paper_bgcolor=BLACK,
+                    font=dict(color=YELLOW),
+                    yaxis=dict(showgrid=False),
+                    xaxis=dict(title=None)
+                )
+                st.plotly_chart(fig_forecast, use_container_width=True)
+                
+                forecast_table = forecasts.rename(columns={
+                    "symbol": "Symbole",
+                    "last_price": "Dernier Cours",
+                    "predicted_price": "Cours Prévu",
+                    "predicted_return": "Rendement Prévu %"
+                })[["Symbole", "Dernier Cours", "Cours Prévu", "Rendement Prévu %"]]
+                st.dataframe(forecast_table.style.format({
+                    "Dernier Cours": "{:,.2f} MAD",
+                    "Cours Prévu": "{:,.2f} MAD",
+                    "Rendement Prévu %": "{:+.2f}%"
+                }), use_container_width=True)
 
 # Footer
 st.markdown(f"""
@@ -0,0 +1,262 @@
+import argparse
+import os
+import time
+
+import gymnasium as gym
+import numpy as np
+from gymnasium.vector import AutoresetMode, VectorEnv
+from gymnasium.vector.utils import batch_space
+
+from corporate_actions import adjust_history
+
+# Tenseur des rendements quotidiens (dates x symboles) mappé en mémoire
+RETURNS_TENSOR_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "rendements.npy"
+)
+DEFAULT_WINDOW = 20
+DEFAULT_EPISODE_LENGTH = 250
+DEFAULT_TRANSACTION_COST = 0.0044  # Commissions et frais de bourse (aller simple)
+DEFAULT_INITIAL_VALUE = 100000.0
+
+
+# Construction du tenseur de rendements à partir de l'historique des cours,
+# ajusté des opérations sur titres (rendements totaux, dividendes réinvestis)
+def build_returns_tensor(history, path=RETURNS_TENSOR_PATH):
+    history = adjust_history(history)
+    returns = history.ffill().pct_change().iloc[1:].fillna(0.0).to_numpy(dtype=np.float32)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.save(path, returns)
+    return path
+
+
+def load_returns_tensor(path=RETURNS_TENSOR_PATH):
+    return np.load(path, mmap_mode="r")
+
+
+class AllocationVectorEnv(VectorEnv):
+    # Environnement d'allocation vectorisé: K épisodes avancés ensemble par opérations sur tableaux.
+    # Action: poids cibles (titres + liquidités), normalisés à 1.
+    # Observation: fenêtre des rendements passés aplatie, suivie des poids courants.
+    # Récompense: P&L de la période (quantité x variation de cours) moins les frais, en % du capital initial.
+    # Réinitialisation dans le même pas (API gymnasium >= 1.1): l'observation et les infos
+    # finales des épisodes terminés sont dans infos["final_obs"] et infos["final_info"].
+    metadata = {"render_modes": [], "autoreset_mode": AutoresetMode.SAME_STEP}
+
+    def __init__(
+        self,
+        num_envs,
+        returns=None,
+        window=DEFAULT_WINDOW,
+        episode_length=DEFAULT_EPISODE_LENGTH,
+        transaction_cost=DEFAULT_TRANSACTION_COST,
+        initial_value=DEFAULT_INITIAL_VALUE,
+        seed=None
+    ):
+        self.returns = load_returns_tensor() if returns is None else returns
+        n_dates, n_assets = self.returns.shape
+        if n_dates <= window + episode_length:
+            raise ValueError(
+                f"Historique trop court: {n_dates} dates pour une fenêtre de {window} "
+                f"et des épisodes de {episode_length} pas"
+            )
+
+        self.num_envs = num_envs
+        self.n_assets = n_assets
+        self.window = window
+        self.episode_length = episode_length
+        self.transaction_cost = transaction_cost
+        self.initial_value = initial_value
+
+        self.single_observation_space = gym.spaces.Box(
+            low=-np.inf, high=np.inf, shape=(window * n_assets + n_assets + 1,), dtype=np.float32
+        )
+        self.single_action_space = gym.spaces.Box(
+            low=0.0, high=1.0, shape=(n_assets + 1,), dtype=np.float32
+        )
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        self.closed = False
+
+        self._window_offsets = np.arange(-window, 0)
+        self._rng = np.random.default_rng(seed)
+        self.t = np.zeros(num_envs, dtype=np.int64)
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+        self.values = np.full(num_envs, initial_value)
+        self.weights = np.zeros((num_envs, n_assets + 1))
+
+    def _reset_envs(self, mask):
+        count = int(mask.sum())
+        if count == 0:
+            return
+        self.t[mask] = self._rng.integers(
+            self.window, self.returns.shape[0] - self.episode_length, size=count
+        )
+        self.steps[mask] = 0
+        self.values[mask] = self.initial_value
+        # Départ entièrement en liquidités
+        self.weights[mask] = 0.0
+        self.weights[mask, -1] = 1.0
+
+    def _observations(self):
+        windows = np.asarray(self.returns[self.t[:, None] + self._window_offsets])
+        return np.concatenate(
+            [windows.reshape(self.num_envs, -1), self.weights], axis=1
+        ).astype(np.float32)
+
+    def reset(self, *, seed=None, options=None):
+        if seed is not None:
+            self._rng = np.random.default_rng(seed)
+        self._reset_envs(np.ones(self.num_envs, dtype=bool))
+        return self._observations(), {}
+
+    def step(self, actions):
+        actions = np.clip(np.asarray(actions, dtype=np.float64), 0.0, None)
+        totals = actions.sum(axis=1, keepdims=True)
+        cash_only = np.zeros_like(actions)
+        cash_only[:, -1] = 1.0
+        targets = np.where(totals > 0, actions / np.where(totals > 0, totals, 1.0), cash_only)
+
+        # Frais proportionnels au volume échangé lors du rééquilibrage
+        turnover = np.abs(targets[:, :-1] - self.weights[:, :-1]).sum(axis=1)
+        costs = self.transaction_cost * turnover * self.values
+
+        # P&L de la période: quantités détenues x variation des cours
+        period_returns = np.asarray(self.returns[self.t], dtype=np.float64)
+        holdings = targets[:, :-1] * (self.values - costs)[:, None]
+        pnl = (holdings * period_returns).sum(axis=1)
+
+        new_values = self.values - costs + pnl
+        rewards = ((pnl - costs) / self.initial_value * 100).astype(np.float32)
+
+        # Dérive des poids avec les cours
+        grown = np.concatenate(
+            [holdings * (1 + period_returns), (targets[:, -1] * (self.values - costs))[:, None]], axis=1
+        )
+        self.weights = grown / np.where(new_values > 0, new_values, 1.0)[:, None]
+        self.values = new_values
+        self.t += 1
+        self.steps += 1
+
+        terminated = self.values <= 0
+        truncated = self.steps >= self.episode_length
+        done = terminated | truncated
+
+        every_env = np.ones(self.num_envs, dtype=bool)
+        infos = {
+            "portfolio_value": self.values.copy(),
+            "_portfolio_value": every_env,
+            "costs": costs,
+            "_costs": every_env
+        }
+        if done.any():
+            final_obs = np.full(self.num_envs, None, dtype=object)
+            observations = self._observations()
+            for i in np.flatnonzero(done):
+                final_obs[i] = observations[i]
+            infos["final_obs"] = final_obs
+            infos["_final_obs"] = done
+            infos["final_info"] = {
+                "portfolio_value": self.values.copy(),
+                "_portfolio_value": done,
+                "costs": costs,
+                "_costs": done
+            }
+            infos["_final_info"] = done
+            self._reset_envs(done)
+
+        return self._observations(), rewards, terminated, truncated, infos
+
+    def close(self, **kwargs):
+        self.closed = True
+
+
+# Adaptateur VecEnv de stable-baselines3 (dépendance optionnelle, importée à la demande).
+# Les épisodes terminés exposent "terminal_observation" et "TimeLimit.truncated" comme attendu par SB3.
+def sb3_vec_env(env):
+    from stable_baselines3.common.vec_env import VecEnv
+
+    class AllocationSB3VecEnv(VecEnv):
+        def __init__(self, env):
+            self.env = env
+            self._seed = None
+            self._actions = None
+            super().__init__(env.num_envs, env.single_observation_space, env.single_action_space)
+
+        def reset(self):
+            observations, _ = self.env.reset(seed=self._seed)
+            self._seed = None
+            return observations
+
+        def seed(self, seed=None):
+            self._seed = seed
+            return [seed] * self.num_envs
+
+        def step_async(self, actions):
+            self._actions = actions
+
+        def step_wait(self):
+            observations, rewards, terminated, truncated, infos = self.env.step(self._actions)
+            dones = terminated | truncated
+            env_infos = [
+                {"portfolio_value": infos["portfolio_value"][i], "costs": infos["costs"][i]}
+                for i in range(self.num_envs)
+            ]
+            for i in np.flatnonzero(dones):
+                env_infos[i]["terminal_observation"] = infos["final_obs"][i]
+                env_infos[i]["TimeLimit.truncated"] = bool(truncated[i] and not terminated[i])
+            return observations, rewards, dones, env_infos
+
+        def close(self):
+            self.env.close()
+
+        def get_attr(self, attr_name, indices=None):
+            return [getattr(self.env, attr_name)] * len(self._get_indices(indices))
+
+        def set_attr(self, attr_name, value, indices=None):
+            setattr(self.env, attr_name, value)
+
+        def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+            result = getattr(self.env, method_name)(*method_args, **method_kwargs)
+            return [result] * len(self._get_indices(indices))
+
+        def env_is_wrapped(self, wrapper_class, indices=None):
+            return [False] * len(self._get_indices(indices))
+
+    return AllocationSB3VecEnv(env)
+
+
+# Débit de l'environnement en pas par seconde (pas d'épisodes individuels)
+def benchmark_steps_per_second(env, n_steps=1000):
+    env.reset(seed=0)
+    actions = env.action_space.sample()
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        env.step(actions)
+    elapsed = time.perf_counter() - start
+    return n_steps * env.num_envs / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de l'environnement d'allocation vectorisé")
+    parser.add_argument("--returns", default=RETURNS_TENSOR_PATH, help="Tenseur de rendements (.npy)")
+    parser.add_argument("--envs", default="1,16,256,4096", help="Nombres d'épisodes parallèles")
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument(
+        "--synthetic", action="store_true",
+        help="Rendements aléatoires (débit uniquement) si aucun historique n'est disponible"
+    )
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        returns = np.random.default_rng(0).normal(0, 0.01, size=(2500, 20)).astype(np.float32)
+    else:
+        returns = load_returns_tensor(args.returns)
+
+    print(f"{'épisodes':>9} {'pas/s':>14}")
+    for num_envs in [int(n) for n in args.envs.split(",")]:
+        env = AllocationVectorEnv(num_envs, returns=returns)
+        print(f"{num_envs:>9} {benchmark_steps_per_second(env, args.steps):>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+
+# Somme par (période, secteur) en une seule passe bincount sur des secteurs codés en entiers
+def _sector_sums(values, sector_codes, n_sectors):
+    n_periods = values.shape[0]
+    flat_index = (np.arange(n_periods)[:, None] * n_sectors + sector_codes[None, :]).ravel()
+    sums = np.bincount(flat_index, weights=values.ravel(), minlength=n_periods * n_sectors)
+    return sums.reshape(n_periods, n_sectors)
+
+
+# Coefficients de lissage de Carino pour relier les effets de plusieurs périodes
+def _carino_coefficients(portfolio_returns, benchmark_returns):
+    def log_ratio(rp, rb):
+        diff = rp - rb
+        with np.errstate(divide="ignore", invalid="ignore"):
+            k = (np.log1p(rp) - np.log1p(rb)) / diff
+        return np.where(np.abs(diff) > 1e-12, k, 1 / (1 + rp))
+
+    period_k = log_ratio(portfolio_returns, benchmark_returns)
+    total_portfolio = np.prod(1 + portfolio_returns) - 1
+    total_benchmark = np.prod(1 + benchmark_returns) - 1
+    total_k = log_ratio(np.array(total_portfolio), np.array(total_benchmark))
+    return period_k / total_k
+
+
+# Attribution de Brinson (allocation, sélection, interaction) par secteur et par période.
+# portfolio_weights, benchmark_weights, returns: matrices (périodes x titres).
+def brinson_attribution(portfolio_weights, benchmark_weights, returns, sector_codes, sectors):
+    portfolio_weights = np.atleast_2d(np.asarray(portfolio_weights, dtype=float))
+    benchmark_weights = np.atleast_2d(np.asarray(benchmark_weights, dtype=float))
+    returns = np.nan_to_num(np.atleast_2d(np.asarray(returns, dtype=float)))
+    sector_codes = np.asarray(sector_codes, dtype=np.int64)
+    n_sectors = len(sectors)
+
+    wp = _sector_sums(portfolio_weights, sector_codes, n_sectors)
+    wb = _sector_sums(benchmark_weights, sector_codes, n_sectors)
+    contribution_p = _sector_sums(portfolio_weights * returns, sector_codes, n_sectors)
+    contribution_b = _sector_sums(benchmark_weights * returns, sector_codes, n_sectors)
+
+    portfolio_total = contribution_p.sum(axis=1)
+    benchmark_total = contribution_b.sum(axis=1)
+
+    # Rendements sectoriels; secteur absent du benchmark -> rendement total du benchmark,
+    # secteur absent du portefeuille -> rendement sectoriel du benchmark (effets nuls)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rb = np.where(wb > 0, contribution_b / wb, benchmark_total[:, None])
+        rp = np.where(wp > 0, contribution_p / wp, rb)
+
+    allocation = (wp - wb) * (rb - benchmark_total[:, None])
+    selection = wb * (rp - rb)
+    interaction = (wp - wb) * (rp - rb)
+
+    coefficients = _carino_coefficients(portfolio_total, benchmark_total)[:, None]
+
+    return {
+        "sectors": list(sectors),
+        "allocation": allocation,
+        "selection": selection,
+        "interaction": interaction,
+        "portfolio_return": np.prod(1 + portfolio_total) - 1,
+        "benchmark_return": np.prod(1 + benchmark_total) - 1,
+        "linked": pd.DataFrame({
+            "allocation": (allocation * coefficients).sum(axis=0),
+            "selection": (selection * coefficients).sum(axis=0),
+            "interaction": (interaction * coefficients).sum(axis=0)
+        }, index=list(sectors))
+    }
+
+
+# Poids quotidiens du portefeuille et du MASI reconstitué à partir de l'historique des cours.
+# Les poids de chaque période sont ceux de la clôture précédente.
+def attribution_inputs(stocks_data, history, masi_index):
+    prices = history.reindex(columns=masi_index.symbols).ffill().bfill()
+    returns = prices.pct_change(fill_method=None).iloc[1:].fillna(0.0).to_numpy()
+    # Symboles absents de l'historique: poids nul (comme dans MasiIndex.level_series)
+    start_prices = prices.iloc[:-1].fillna(0.0).to_numpy()
+    dates = prices.index[1:]
+
+    quantities = np.zeros((len(dates), len(masi_index.symbols)))
+    for stock in stocks_data:
+        i = masi_index.positions.get(stock["symbol"])
+        if i is None:
+            continue
+        buy_date = pd.Timestamp(stock.get("buy_date") or prices.index[0])
+        quantities[:, i] += np.where(prices.index[:-1] >= buy_date, stock["quantity"], 0.0)
+
+    portfolio_values = quantities * start_prices
+    benchmark_caps = start_prices * (masi_index.shares * masi_index.float_factors)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        portfolio_weights = np.nan_to_num(portfolio_values / portfolio_values.sum(axis=1, keepdims=True))
+        benchmark_weights = np.nan_to_num(benchmark_caps / benchmark_caps.sum(axis=1, keepdims=True))
+
+    # Périodes où le portefeuille n'est pas encore investi exclues
+    invested = portfolio_weights.sum(axis=1) > 0
+    return (
+        dates[invested],
+        portfolio_weights[invested],
+        benchmark_weights[invested],
+        returns[invested]
+    )
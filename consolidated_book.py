@@ -0,0 +1,210 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from returns_engine import xirr_batch
+
+# Fichier des portefeuilles clients (colonnes: portfolio_id, symbol, quantity, buy_price, buy_date)
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "portefeuilles.csv")
+BOOK_COLUMNS = ["portfolio_id", "symbol", "quantity", "buy_price", "buy_date"]
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+CHUNK_SIZE = 2000
+
+
+class ConsolidatedBook:
+    # Portefeuilles x titres en matrices creuses (CSR): quantités et montants investis.
+    # Les codes des titres suivent l'ordre de l'univers (MOROCCAN_STOCKS).
+    def __init__(self, positions, universe):
+        self.symbols = [stock["symbol"] for stock in universe]
+        self.names = {stock["symbol"]: stock["name"] for stock in universe}
+        self.sectors = list(dict.fromkeys(stock["sector"] for stock in universe))
+        sector_positions = {sector: i for i, sector in enumerate(self.sectors)}
+        self.sector_codes = np.array([sector_positions[stock["sector"]] for stock in universe])
+        symbol_positions = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        # Les titres hors univers sont écartés
+        symbol_codes = positions["symbol"].map(symbol_positions)
+        self.skipped_positions = int(symbol_codes.isna().sum())
+        positions = positions[symbol_codes.notna()].reset_index(drop=True)
+        self.symbol_codes = symbol_codes.dropna().astype(np.int64).to_numpy()
+
+        self.portfolio_codes, self.portfolio_ids = pd.factorize(positions["portfolio_id"])
+        buy_dates = pd.to_datetime(positions["buy_date"]).to_numpy(dtype="datetime64[ns]")
+        shape = (len(self.portfolio_ids), len(self.symbols))
+
+        # Positions triées par portefeuille puis date d'achat, avec pointeurs de début par portefeuille
+        order = np.lexsort((buy_dates, self.portfolio_codes))
+        self.position_portfolios = self.portfolio_codes[order]
+        self.position_dates = buy_dates[order]
+        self.position_symbols = self.symbol_codes[order]
+        self.position_quantities = positions["quantity"].to_numpy(dtype=float)[order]
+        self.position_amounts = (
+            positions["quantity"].to_numpy(dtype=float) * positions["buy_price"].to_numpy(dtype=float)
+        )[order]
+        self.position_offsets = np.searchsorted(self.position_portfolios, np.arange(shape[0] + 1))
+
+        # Les achats multiples d'un même titre sont cumulés dans la même cellule
+        self.quantities = sparse.csr_matrix(
+            (positions["quantity"].to_numpy(dtype=float), (self.portfolio_codes, self.symbol_codes)),
+            shape=shape
+        )
+        self.investments = sparse.csr_matrix(
+            (positions["quantity"].to_numpy(dtype=float) * positions["buy_price"].to_numpy(dtype=float),
+             (self.portfolio_codes, self.symbol_codes)),
+            shape=shape
+        )
+
+        # Appartenance sectorielle des titres (titres x secteurs)
+        self.sector_membership = sparse.csr_matrix(
+            (np.ones(len(self.symbols)), (np.arange(len(self.symbols)), self.sector_codes)),
+            shape=(len(self.symbols), len(self.sectors))
+        )
+
+    def __len__(self):
+        return len(self.portfolio_ids)
+
+
+def load_book(universe, path=BOOK_PATH):
+    positions = pd.read_csv(path, usecols=BOOK_COLUMNS)
+    return ConsolidatedBook(positions, universe)
+
+
+# Matrices de flux (portefeuilles x positions) pour le XIRR: achats puis valeur finale
+# (dividendes et droits perçus inclus)
+def _cash_flow_matrices(book, start, end, values, as_of):
+    first, last = book.position_offsets[start], book.position_offsets[end]
+    local = book.position_portfolios[first:last] - start
+    dates = book.position_dates[first:last]
+    counts = np.diff(book.position_offsets[start:end + 1])
+    slots = np.arange(last - first) - np.repeat(book.position_offsets[start:end] - first, counts)
+    # Premier achat de chaque portefeuille (positions triées par date)
+    first_positions = np.minimum(book.position_offsets[start:end], len(book.position_dates) - 1)
+    first_dates = book.position_dates[first_positions]
+
+    width = counts.max(initial=0) + 1
+    amounts = np.zeros((end - start, width))
+    times = np.zeros((end - start, width))
+    amounts[local, slots] = -book.position_amounts[first:last]
+    times[local, slots] = (dates - first_dates[local]) / np.timedelta64(365, "D")
+    amounts[:, -1] = values
+    times[:, -1] = (np.datetime64(as_of, "ns") - first_dates) / np.timedelta64(365, "D")
+    return amounts, times
+
+
+def _evaluate_chunk(book, held_quantities, dividends, start, end, prices, as_of):
+    quantities = held_quantities[start:end]
+    values = quantities @ prices
+    investments = np.asarray(book.investments[start:end].sum(axis=1)).ravel()
+    sector_values = quantities.multiply(prices).tocsr() @ book.sector_membership
+    amounts, times = _cash_flow_matrices(book, start, end, values + dividends[start:end], as_of)
+    return values, investments, sector_values, xirr_batch(amounts, times)
+
+
+# Évaluation de tous les portefeuilles par blocs en parallèle, avec un vecteur de cours partagé.
+# corporate_actions: opérations sur titres appliquées depuis l'achat de chaque position
+# (actions reçues par division, dividendes et droits perçus).
+def evaluate_book(book, prices, as_of=None, workers=DEFAULT_WORKERS, corporate_actions=None):
+    as_of = pd.Timestamp(as_of or datetime.now().date())
+    # Copie figée: le vecteur de l'appelant reste modifiable
+    prices = np.array(prices, dtype=float)
+    prices.flags.writeable = False
+
+    if corporate_actions is not None:
+        share_factors, distributions = corporate_actions.position_adjustments(
+            np.asarray(book.symbols, dtype=object)[book.position_symbols], book.position_dates, as_of
+        )
+        held_quantities = sparse.csr_matrix(
+            (book.position_quantities * share_factors, (book.position_portfolios, book.position_symbols)),
+            shape=book.quantities.shape
+        )
+    else:
+        share_factors = np.ones(len(book.position_dates))
+        distributions = np.zeros(len(book.position_dates))
+        held_quantities = book.quantities
+    position_dividends = book.position_quantities * distributions
+    dividends = np.bincount(book.position_portfolios, weights=position_dividends, minlength=len(book))
+    chunks = [
+        (start, min(start + CHUNK_SIZE, len(book)))
+        for start in range(0, len(book), CHUNK_SIZE)
+    ]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            lambda chunk: _evaluate_chunk(
+                book, held_quantities, dividends, chunk[0], chunk[1], prices, as_of
+            ),
+            chunks
+        ))
+
+    values = np.concatenate([r[0] for r in results]) if results else np.zeros(0)
+    investments = np.concatenate([r[1] for r in results]) if results else np.zeros(0)
+    sector_values = sparse.vstack([r[2] for r in results]).tocsr() if results else None
+    irr = np.concatenate([r[3] for r in results]) if results else np.zeros(0)
+
+    # Expositions agrégées du book par titre et par secteur
+    symbol_exposure = np.asarray(held_quantities.sum(axis=0)).ravel() * prices
+    sector_exposure = np.bincount(book.sector_codes, weights=symbol_exposure, minlength=len(book.sectors))
+
+    pnl = values + dividends - investments
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pnl_percentage = np.where(investments > 0, pnl / investments * 100, 0.0)
+
+    return {
+        "as_of": as_of,
+        "prices": prices,
+        "values": values,
+        "investments": investments,
+        "dividends": dividends,
+        "pnl": pnl,
+        "pnl_percentage": pnl_percentage,
+        "money_weighted_returns": irr * 100,
+        "sector_values": sector_values,
+        "symbol_exposure": pd.Series(symbol_exposure, index=book.symbols),
+        "sector_exposure": pd.Series(sector_exposure, index=book.sectors),
+        "position_share_factors": share_factors,
+        "position_dividends": position_dividends
+    }
+
+
+def book_summary(book, evaluation):
+    return pd.DataFrame({
+        "portfolio_id": book.portfolio_ids,
+        "investment": evaluation["investments"],
+        "value": evaluation["values"],
+        "pnl": evaluation["pnl"],
+        "pnl_percentage": evaluation["pnl_percentage"],
+        "money_weighted_return": evaluation["money_weighted_returns"]
+    })
+
+
+# Performances par position d'un portefeuille (date d'achat, actions détenues et
+# distributions depuis l'achat), lues dans l'évaluation du book (sans recalcul)
+def portfolio_performances(book, evaluation, row):
+    sectors = book.sectors
+    performances = []
+    for position in range(book.position_offsets[row], book.position_offsets[row + 1]):
+        code = book.position_symbols[position]
+        symbol = book.symbols[code]
+        quantity = book.position_quantities[position] * evaluation["position_share_factors"][position]
+        value = quantity * evaluation["prices"][code]
+        investment = book.position_amounts[position]
+        dividends = evaluation["position_dividends"][position]
+        pnl = value + dividends - investment
+        performances.append({
+            "symbol": symbol,
+            "name": book.names[symbol],
+            "quantity": quantity,
+            "buy_date": pd.Timestamp(book.position_dates[position]).date(),
+            "current_price": evaluation["prices"][code],
+            "value": value,
+            "investment": investment,
+            "dividends": dividends,
+            "pnl": pnl,
+            "pnl_percentage": pnl / investment * 100 if investment > 0 else 0,
+            "sector": sectors[book.sector_codes[code]]
+        })
+    return performances
@@ -0,0 +1,221 @@
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from price_history import cached_price_history
+from shared_cache import freeze_frame, get_shared_cache
+
+# Table des opérations sur titres (colonnes: symbol, ex_date, action_type, value, subscription_price)
+# - dividend: value = dividende par action (MAD)
+# - split: value = nombre d'actions nouvelles pour une ancienne
+# - rights: value = actions nouvelles par action ancienne, au prix subscription_price
+CORPORATE_ACTIONS_PATH = os.environ.get(
+    "CORPORATE_ACTIONS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "operations_sur_titres.csv")
+)
+ACTION_TYPES = ("dividend", "split", "rights")
+ACTION_COLUMNS = ["symbol", "ex_date", "action_type", "value", "subscription_price"]
+
+
+# Motif de rejet d'une opération, ou None si elle est valide
+def invalid_action_reason(action):
+    if not isinstance(action["symbol"], str) or not action["symbol"]:
+        return "symbole manquant"
+    if pd.isna(action["ex_date"]):
+        return "date de détachement manquante"
+    if action["action_type"] not in ACTION_TYPES:
+        return f"type d'opération inconnu: {action['action_type']}"
+    value = pd.to_numeric(action["value"], errors="coerce")
+    if not np.isfinite(value) or value <= 0:
+        return f"valeur invalide: {action['value']}"
+    if action["action_type"] == "rights":
+        price = pd.to_numeric(action["subscription_price"], errors="coerce")
+        if not np.isfinite(price) or price < 0:
+            return f"prix de souscription invalide: {action['subscription_price']}"
+    return None
+
+
+# Les lignes invalides sont écartées (avec avertissement) pour ne pas fausser les facteurs
+def load_corporate_actions(path=CORPORATE_ACTIONS_PATH):
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=ACTION_COLUMNS)
+    actions = pd.read_csv(path, parse_dates=["ex_date"]).reindex(columns=ACTION_COLUMNS)
+    reasons = actions.apply(invalid_action_reason, axis=1) if len(actions) else pd.Series(dtype=object)
+    rejected = reasons.notna()
+    for line, reason in reasons[rejected].items():
+        warnings.warn(f"{path}: ligne {line + 2} ignorée ({reason})")
+    return actions[~rejected].reset_index(drop=True)
+
+
+class CorporateActions:
+    # Facteurs d'ajustement cumulés précalculés par symbole, alignés sur l'historique brut.
+    # capital_factors: divisions et droits de souscription; total_factors: y compris dividendes.
+    # Les cours ajustés s'obtiennent par simple multiplication, sans réécrire l'historique.
+    def __init__(self, actions=None, history=None):
+        actions = actions if actions is not None else pd.DataFrame(columns=ACTION_COLUMNS)
+        self.actions = actions.reindex(columns=ACTION_COLUMNS).reset_index(drop=True)
+        self.actions["ex_date"] = pd.to_datetime(self.actions["ex_date"])
+        self.history = history
+        self.frozen = False
+
+        if history is not None:
+            self.capital_factors = pd.DataFrame(1.0, index=history.index, columns=history.columns)
+            self.total_factors = self.capital_factors.copy()
+            for symbol in self.actions["symbol"].unique():
+                self._recompute(symbol)
+
+    def symbol_actions(self, symbol):
+        return self.actions[self.actions["symbol"] == symbol].sort_values("ex_date")
+
+    # Cours de clôture de la veille de la date de détachement
+    def _previous_close(self, symbol, ex_date):
+        if self.history is None or symbol not in self.history.columns:
+            return None
+        before = self.history[symbol].loc[self.history.index < ex_date].dropna()
+        return before.iloc[-1] if len(before) else None
+
+    # Dividende supérieur ou égal au cours de la veille: facteur nul ou négatif, événement ignoré
+    def _excessive_dividend(self, action, previous_close):
+        if action["action_type"] != "dividend" or previous_close is None or action["value"] < previous_close:
+            return False
+        warnings.warn(
+            f"{action['symbol']} {action['ex_date']:%Y-%m-%d}: dividende {action['value']} "
+            f"supérieur ou égal au cours de la veille ({previous_close}), ignoré"
+        )
+        return True
+
+    # Facteur de prix d'un événement: (facteur capital, facteur total)
+    def _event_factors(self, action, previous_close):
+        if action["action_type"] == "split":
+            factor = 1.0 / action["value"]
+            return factor, factor
+        if previous_close is None or previous_close <= 0 or self._excessive_dividend(action, previous_close):
+            return 1.0, 1.0
+        if action["action_type"] == "dividend":
+            return 1.0, 1.0 - action["value"] / previous_close
+        # Droits: prix théorique après détachement (TERP)
+        ratio = action["value"]
+        terp = (previous_close + ratio * action["subscription_price"]) / (1 + ratio)
+        factor = terp / previous_close
+        return factor, factor
+
+    # Recalcul des seuls vecteurs de facteurs du symbole concerné
+    def _recompute(self, symbol):
+        if self.history is None or symbol not in self.history.columns:
+            return
+        dates = self.history.index
+        capital_events = np.ones(len(dates))
+        total_events = np.ones(len(dates))
+
+        for _, action in self.symbol_actions(symbol).iterrows():
+            position = dates.searchsorted(action["ex_date"])
+            if position == 0 or position >= len(dates):
+                continue
+            capital, total = self._event_factors(action, self._previous_close(symbol, action["ex_date"]))
+            capital_events[position] *= capital
+            total_events[position] *= total
+
+        # Facteur cumulé à la date t = produit des événements postérieurs à t
+        self.capital_factors[symbol] = np.append(np.cumprod(capital_events[::-1])[::-1][1:], 1.0)
+        self.total_factors[symbol] = np.append(np.cumprod(total_events[::-1])[::-1][1:], 1.0)
+
+    # Taille mémoire (octets) de la table, des facteurs et de l'historique référencé
+    def memory_usage(self):
+        frames = [self.actions]
+        if self.history is not None:
+            frames += [self.capital_factors, self.total_factors, self.history]
+        return sum(int(frame.memory_usage(deep=True).sum()) for frame in frames)
+
+    # Instance partagée par le cache: plus aucune modification, les sessions passent par copy()
+    def freeze(self):
+        self.frozen = True
+        self.actions = freeze_frame(self.actions)
+        if self.history is not None:
+            self.capital_factors = freeze_frame(self.capital_factors)
+            self.total_factors = freeze_frame(self.total_factors)
+
+    def copy(self):
+        clone = CorporateActions.__new__(CorporateActions)
+        clone.actions = self.actions.copy()
+        clone.history = self.history
+        clone.frozen = False
+        if self.history is not None:
+            clone.capital_factors = self.capital_factors.copy()
+            clone.total_factors = self.total_factors.copy()
+        return clone
+
+    def add_action(self, symbol, ex_date, action_type, value, subscription_price=None):
+        if self.frozen:
+            raise RuntimeError("Opérations sur titres partagées en lecture seule: utiliser copy()")
+        action = {
+            "symbol": symbol,
+            "ex_date": pd.Timestamp(ex_date),
+            "action_type": action_type,
+            "value": value,
+            "subscription_price": subscription_price
+        }
+        reason = invalid_action_reason(action)
+        if reason is not None:
+            raise ValueError(f"Opération sur titres invalide pour {symbol}: {reason}")
+        self.actions = pd.concat([self.actions, pd.DataFrame([action])], ignore_index=True)
+        self._recompute(symbol)
+
+    # Cours ajustés: multiplication vectorisée de l'historique brut par les facteurs cumulés
+    def adjust(self, history, include_dividends=True):
+        if self.history is None:
+            return history
+        factors = self.total_factors if include_dividends else self.capital_factors
+        # Facteur neutre uniquement pour les dates et symboles absents des facteurs
+        factors = factors.reindex(index=history.index, columns=history.columns, fill_value=1.0)
+        return history * factors
+
+    def adjusted_returns(self, history, include_dividends=True):
+        return self.adjust(history, include_dividends).pct_change().iloc[1:]
+
+    # Ajustement de positions entre leur date d'achat et as_of, vectorisé sur les positions:
+    # (facteurs sur le nombre d'actions, montants distribués par action achetée)
+    def position_adjustments(self, symbols, buy_dates, as_of):
+        symbols = np.asarray(symbols, dtype=object)
+        buy_dates = pd.to_datetime(np.asarray(buy_dates)).to_numpy(dtype="datetime64[ns]")
+        as_of = pd.Timestamp(as_of)
+        share_factors = np.ones(len(symbols))
+        distributions = np.zeros(len(symbols))
+
+        actions = self.actions[(self.actions["ex_date"] <= as_of) & self.actions["symbol"].isin(symbols)]
+        for _, action in actions.sort_values("ex_date").iterrows():
+            held = (symbols == action["symbol"]) & (buy_dates < action["ex_date"].to_datetime64())
+            if not held.any():
+                continue
+            if action["action_type"] == "split":
+                share_factors[held] *= action["value"]
+                continue
+            previous_close = self._previous_close(action["symbol"], action["ex_date"])
+            if action["action_type"] == "dividend":
+                if not self._excessive_dividend(action, previous_close):
+                    distributions[held] += action["value"] * share_factors[held]
+            elif previous_close is not None:
+                # Droits supposés cédés à leur valeur théorique
+                ratio = action["value"]
+                terp = (previous_close + ratio * action["subscription_price"]) / (1 + ratio)
+                distributions[held] += (previous_close - terp) * share_factors[held]
+
+        return share_factors, distributions
+
+    def position_adjustment(self, symbol, buy_date, as_of):
+        share_factors, distributions = self.position_adjustments([symbol], [buy_date], as_of)
+        return share_factors[0], distributions[0]
+
+
+# Historique ajusté hors cache, pour les tâches batch (entraînement, tenseur de rendements)
+def adjust_history(history, include_dividends=True, path=CORPORATE_ACTIONS_PATH):
+    return CorporateActions(load_corporate_actions(path), history).adjust(history, include_dividends)
+
+
+# Table et facteurs partagés entre sessions, alignés sur l'historique brut en cache
+def cached_corporate_actions(path=CORPORATE_ACTIONS_PATH):
+    return get_shared_cache().get_or_load(
+        ("corporate_actions", path),
+        lambda: CorporateActions(load_corporate_actions(path), cached_price_history())
+    )
@@ -0,0 +1,180 @@
+import argparse
+import os
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from corporate_actions import adjust_history
+from price_history import PRICE_HISTORY_PATH, load_price_history
+from shared_cache import get_shared_cache
+
+# TensorFlow n'est importé que pour l'entraînement et l'inférence (jamais au démarrage du tableau de bord)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_VERSION = os.environ.get("FORECAST_MODEL_VERSION", "v1")
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+FORECASTS_DIR = os.path.join(BASE_DIR, "data", "previsions")
+WINDOW = 30
+BATCH_SIZE = 256
+EPOCHS = 10
+
+
+def model_path(version=MODEL_VERSION):
+    return os.path.join(MODELS_DIR, f"forecast_{version}.keras")
+
+
+def forecasts_path(version, as_of):
+    return os.path.join(FORECASTS_DIR, f"{version}_{pd.Timestamp(as_of):%Y-%m-%d}.csv")
+
+
+# Rendements logarithmiques quotidiens (dates x symboles)
+def log_returns(history):
+    return np.log(history.ffill()).diff().iloc[1:].fillna(0.0)
+
+
+# Fenêtres d'entraînement générées à la volée, symbole par symbole
+def _window_generator(returns, window):
+    values = returns.to_numpy(dtype=np.float32)
+    def generate():
+        for j in range(values.shape[1]):
+            series = values[:, j]
+            for end in range(window, len(series)):
+                yield series[end - window:end, None], series[end:end + 1]
+    return generate
+
+
+# Pipeline tf.data en flux: aucune matrice de fenêtres n'est matérialisée en mémoire
+def make_training_dataset(history, window=WINDOW, batch_size=BATCH_SIZE, shuffle_buffer=10000):
+    import tensorflow as tf
+
+    returns = log_returns(history)
+    dataset = tf.data.Dataset.from_generator(
+        _window_generator(returns, window),
+        output_signature=(
+            tf.TensorSpec(shape=(window, 1), dtype=tf.float32),
+            tf.TensorSpec(shape=(1,), dtype=tf.float32)
+        )
+    )
+    return dataset.shuffle(shuffle_buffer).batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+def build_model(window=WINDOW):
+    import tensorflow as tf
+
+    model = tf.keras.Sequential([
+        tf.keras.layers.Input(shape=(window, 1)),
+        tf.keras.layers.LSTM(32),
+        tf.keras.layers.Dense(16, activation="relu"),
+        tf.keras.layers.Dense(1)
+    ])
+    model.compile(optimizer="adam", loss="mse")
+    return model
+
+
+def train_model(history, version=MODEL_VERSION, window=WINDOW, epochs=EPOCHS):
+    model = build_model(window)
+    model.fit(make_training_dataset(history, window), epochs=epochs, verbose=0)
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    model.save(model_path(version))
+    return model
+
+
+def load_model(version=MODEL_VERSION):
+    import tensorflow as tf
+
+    return tf.keras.models.load_model(model_path(version))
+
+
+# Inférence de tout l'univers en un seul appel au modèle
+def predict_universe(model, history, as_of, window=WINDOW):
+    history = history.loc[history.index <= pd.Timestamp(as_of)]
+    returns = log_returns(history)
+    if len(returns) < window:
+        raise ValueError(f"Historique insuffisant: {len(returns)} rendements pour une fenêtre de {window}")
+
+    windows = returns.iloc[-window:].to_numpy(dtype=np.float32).T[:, :, None]
+    predicted = model.predict(windows, batch_size=len(windows), verbose=0)[:, 0]
+    last_prices = history.ffill().iloc[-1].to_numpy()
+
+    return pd.DataFrame({
+        "symbol": returns.columns,
+        "predicted_return": np.expm1(predicted) * 100,
+        "last_price": last_prices,
+        "predicted_price": last_prices * np.exp(predicted)
+    })
+
+
+# Calcul et persistance des prévisions du jour (tâche quotidienne, hors sessions utilisateur)
+def run_daily_forecast(as_of=None, version=MODEL_VERSION, history_path=PRICE_HISTORY_PATH):
+    as_of = pd.Timestamp(as_of or datetime.now().date())
+    history = load_price_history(history_path)
+    if history is None:
+        raise FileNotFoundError(f"Historique des cours introuvable: {history_path}")
+    # Cours ajustés des divisions et droits: pas de faux rendements aux dates de détachement
+    history = adjust_history(history, include_dividends=False)
+
+    forecasts = predict_universe(load_model(version), history, as_of)
+    os.makedirs(FORECASTS_DIR, exist_ok=True)
+    forecasts.to_csv(forecasts_path(version, as_of), index=False)
+    return forecasts
+
+
+# Date des dernières prévisions disponibles pour une version, au plus tard à as_of
+def latest_forecast_date(as_of, version=MODEL_VERSION):
+    if not os.path.isdir(FORECASTS_DIR):
+        return None
+    # Seuls les fichiers {version}_AAAA-MM-JJ.csv sont des prévisions (copies et autres versions ignorées)
+    pattern = re.compile(rf"^{re.escape(version)}_(\d{{4}}-\d{{2}}-\d{{2}})\.csv$")
+    dates = []
+    for name in os.listdir(FORECASTS_DIR):
+        match = pattern.match(name)
+        if match is None:
+            continue
+        try:
+            date = pd.Timestamp(match.group(1))
+        except ValueError:
+            continue
+        if date <= as_of:
+            dates.append(date)
+    return max(dates) if dates else None
+
+
+# Lecture des prévisions persistées par (version du modèle, date), sans exécuter le modèle.
+# Retourne les plus récentes disponibles à as_of, ou None. La date de modification du fichier
+# fait partie de la clé: un nouveau calcul pour la même date est relu immédiatement.
+def load_forecasts(as_of=None, version=MODEL_VERSION):
+    as_of = pd.Timestamp(as_of or datetime.now().date()).normalize()
+    forecast_date = latest_forecast_date(as_of, version)
+    if forecast_date is None:
+        return None, None
+
+    path = forecasts_path(version, forecast_date)
+    forecasts = get_shared_cache().get_or_load(
+        ("forecasts", version, forecast_date, os.path.getmtime(path)),
+        lambda: pd.read_csv(path)
+    )
+    return forecasts, forecast_date
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Entraînement et prévisions quotidiennes des cours")
+    parser.add_argument("command", choices=["train", "predict"])
+    parser.add_argument("--as-of", default=None, help="Date d'évaluation (AAAA-MM-JJ)")
+    parser.add_argument("--version", default=MODEL_VERSION)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        history = load_price_history()
+        if history is None:
+            raise SystemExit(f"Historique des cours introuvable: {PRICE_HISTORY_PATH}")
+        train_model(adjust_history(history, include_dividends=False), args.version, epochs=args.epochs)
+        print(f"Modèle enregistré: {model_path(args.version)}")
+    else:
+        forecasts = run_daily_forecast(args.as_of, args.version)
+        print(forecasts.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
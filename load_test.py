@@ -0,0 +1,312 @@
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.Selectbox_pb2 import Selectbox
+
+# Script ciblé par défaut: la page principale avec les onglets d'analyse
+DEFAULT_APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Portfolio.py")
+DEFAULT_SESSION_COUNTS = [1, 5, 10, 20]
+DEFAULT_POSITIONS = 3
+RERUN_TIMEOUT = 60
+SERVER_START_TIMEOUT = 60
+RSS_SAMPLE_INTERVAL = 0.05
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+# Les selectbox envoient l'index de l'option (int_value) jusqu'à l'arrivée
+# d'accept_new_options, puis le libellé de l'option (string_value)
+SELECTBOX_SENDS_STRING = "accept_new_options" in Selectbox.DESCRIPTOR.fields_by_name
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Serveur Streamlit unique partagé par toutes les sessions, comme en production
+def start_server(app_path, port):
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", app_path,
+            "--server.headless", "true",
+            "--server.port", str(port),
+            "--browser.gatherUsageStats", "false"
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Le serveur Streamlit s'est arrêté (code {server.returncode})")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1)
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Le serveur Streamlit n'a pas démarré à temps")
+
+
+# RSS (Mo) et temps CPU (s) du processus serveur, lus dans /proc (Linux)
+def server_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def server_cpu_s(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            fields = stat.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return float("nan")
+
+
+class StreamlitClient:
+    # Client websocket minimal: envoie les valeurs des widgets comme le navigateur
+    # et mesure chaque rerun jusqu'au message script_finished.
+    def __init__(self, url):
+        self.url = url
+        self.widgets = {}
+        self.widget_states = {}
+        self.latencies = []
+        self.errors = []
+        self.tabs = 0
+
+    async def __aenter__(self):
+        self.websocket = await websockets.connect(
+            self.url, subprotocols=["streamlit"], max_size=None
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.websocket.close()
+
+    # Identifiant d'un widget par sa clé, ou par son libellé s'il n'a pas de clé
+    def widget(self, key=None, label=None):
+        for widget_id, (kind, proto) in self.widgets.items():
+            if key is not None and widget_id.endswith(f"-{key}"):
+                return widget_id, proto
+            if label is not None and getattr(proto, "label", None) == label:
+                return widget_id, proto
+        raise KeyError(key or label)
+
+    def set_value(self, widget_id, field, value):
+        self.widget_states[widget_id] = (field, value)
+
+    def select_option(self, widget_id, selectbox, index):
+        if SELECTBOX_SENDS_STRING:
+            self.set_value(widget_id, "string_value", selectbox.options[index])
+        else:
+            self.set_value(widget_id, "int_value", index)
+
+    async def rerun(self, trigger=None):
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        for widget_id, (field, value) in self.widget_states.items():
+            state = message.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            setattr(state, field, value)
+        if trigger is not None:
+            state = message.rerun_script.widget_states.widgets.add()
+            state.id = trigger
+            state.trigger_value = True
+
+        self.tabs = 0
+        start = time.perf_counter()
+        await self.websocket.send(message.SerializeToString())
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(
+                await asyncio.wait_for(self.websocket.recv(), RERUN_TIMEOUT)
+            )
+            kind = forward.WhichOneof("type")
+            if kind == "delta":
+                self._read_delta(forward.delta)
+            elif kind == "script_finished":
+                break
+        self.latencies.append(time.perf_counter() - start)
+
+    def _read_delta(self, delta):
+        if delta.WhichOneof("type") == "add_block" and delta.add_block.WhichOneof("type") == "tab_container":
+            self.tabs += 1
+        if delta.WhichOneof("type") != "new_element":
+            return
+        element = delta.new_element
+        kind = element.WhichOneof("type")
+        if kind == "exception":
+            self.errors.append(f"{element.exception.type}: {element.exception.message}")
+            return
+        proto = getattr(element, kind)
+        widget_id = getattr(proto, "id", "")
+        if widget_id.startswith("$$ID-"):
+            self.widgets[widget_id] = (kind, proto)
+
+
+# Scénario d'une session: ajout de positions, analyse du portefeuille puis rendu des onglets
+async def run_session(url, n_positions, start_event=None):
+    client = StreamlitClient(url)
+    if start_event is not None:
+        await start_event.wait()
+
+    try:
+        async with client:
+            await client.rerun()
+
+            count_id, _ = client.widget(label="Nombre d'actions")
+            client.set_value(count_id, "double_value", n_positions)
+            await client.rerun()
+
+            for i in range(n_positions):
+                stock_id, selectbox = client.widget(key=f"stock_{i}")
+                client.select_option(stock_id, selectbox, i % len(selectbox.options))
+                await client.rerun()
+                quantity_id, _ = client.widget(key=f"quantity_{i}")
+                client.set_value(quantity_id, "double_value", 10 * (i + 1))
+                await client.rerun()
+
+            button_id, _ = client.widget(key="calculate_portfolio")
+            await client.rerun(trigger=button_id)
+            if not client.errors and client.tabs == 0:
+                client.errors.append("Aucun onglet rendu après l'analyse du portefeuille")
+    except Exception as e:
+        client.errors.append(f"{type(e).__name__}: {e}")
+
+    return {"latencies": client.latencies, "errors": client.errors}
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+async def _sample_rss(pid, samples, stop):
+    while not stop.is_set():
+        samples.append(server_rss_mb(pid))
+        await asyncio.sleep(RSS_SAMPLE_INTERVAL)
+
+
+# N sessions websocket concurrentes contre le même serveur, démarrées ensemble.
+# RSS et CPU sont ceux du serveur entier, comparés à l'état chaud avant la charge.
+async def run_load(url, pid, n_sessions, n_positions):
+    rss_before = server_rss_mb(pid)
+    cpu_before = server_cpu_s(pid)
+    start_event = asyncio.Event()
+    stop = asyncio.Event()
+    samples = [rss_before]
+    sampler = asyncio.create_task(_sample_rss(pid, samples, stop))
+    pending = asyncio.gather(*[
+        run_session(url, n_positions, start_event) for _ in range(n_sessions)
+    ])
+
+    wall_before = time.perf_counter()
+    start_event.set()
+    sessions = await pending
+    wall = time.perf_counter() - wall_before
+    stop.set()
+    await sampler
+
+    latencies = [latency for session in sessions for latency in session["latencies"]]
+    errors = [error for session in sessions for error in session["errors"]]
+    cpu = server_cpu_s(pid) - cpu_before
+    rss_peak = max(samples)
+
+    return {
+        "sessions": n_sessions,
+        "reruns": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies, default=float("nan")) * 1000,
+        "wall_s": wall,
+        "cpu_s": cpu,
+        "cpu_per_session_s": cpu / n_sessions,
+        "rss_mb": rss_peak,
+        "rss_per_session_mb": max(rss_peak - rss_before, 0.0) / n_sessions,
+        "errors": errors
+    }
+
+
+async def run_all(url, pid, session_counts, n_positions):
+    # Session d'échauffement hors mesures: imports, compilation du script et cache partagé
+    warmup = await run_session(url, n_positions)
+    warmup["rss_mb"] = server_rss_mb(pid)
+    results = [await run_load(url, pid, n, n_positions) for n in session_counts]
+    return warmup, results
+
+
+def print_report(warmup, results):
+    print(
+        f"Échauffement: {len(warmup['latencies'])} reruns, "
+        f"{sum(warmup['latencies']):.2f} s, RSS serveur chaud {warmup['rss_mb']:.1f} Mo"
+    )
+    header = (
+        f"{'sessions':>8} {'reruns':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} "
+        f"{'wall s':>8} {'cpu s':>8} {'cpu/sess':>9} {'rss pic':>9} {'Δrss/sess':>10} {'erreurs':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['sessions']:>8} {r['reruns']:>7} {r['p50_ms']:>9.1f} {r['p90_ms']:>9.1f} "
+            f"{r['p99_ms']:>9.1f} {r['max_ms']:>9.1f} {r['wall_s']:>8.2f} {r['cpu_s']:>8.2f} "
+            f"{r['cpu_per_session_s']:>9.3f} {r['rss_mb']:>9.1f} {r['rss_per_session_mb']:>10.2f} "
+            f"{len(r['errors']):>8}"
+        )
+    for error in sorted(set(warmup["errors"])):
+        print(f"[échauffement] {error}")
+    for r in results:
+        for error in sorted(set(r["errors"])):
+            print(f"[{r['sessions']} sessions] {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Test de charge: sessions websocket concurrentes sur un serveur Streamlit"
+    )
+    parser.add_argument("--app", default=DEFAULT_APP, help="Script Streamlit à tester")
+    parser.add_argument(
+        "--sessions",
+        default=",".join(str(n) for n in DEFAULT_SESSION_COUNTS),
+        help="Nombres de sessions concurrentes, séparés par des virgules"
+    )
+    parser.add_argument(
+        "--positions", type=int, default=DEFAULT_POSITIONS,
+        help="Nombre de positions ajoutées par session"
+    )
+    parser.add_argument("--port", type=int, default=None, help="Port du serveur (libre par défaut)")
+    args = parser.parse_args(argv)
+
+    session_counts = [int(n) for n in args.sessions.split(",") if n.strip()]
+    port = args.port or free_port()
+    server = start_server(args.app, port)
+    try:
+        url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        warmup, results = asyncio.run(run_all(url, server.pid, session_counts, args.positions))
+        print_report(warmup, results)
+    finally:
+        server.terminate()
+        server.wait()
+    return 1 if warmup["errors"] or any(r["errors"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from shared_cache import get_shared_cache
+
+# Niveau de base du MASI et de ses indices sectoriels
+MASI_BASE_LEVEL = 1000.0
+
+# Nombre de titres et facteur de flottant des constituants (colonnes: symbol, shares, float_factor)
+INDEX_CONSTITUENTS_PATH = os.environ.get(
+    "INDEX_CONSTITUENTS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "constituants_masi.csv")
+)
+
+
+# Constituants enrichis des capitalisations flottantes; univers inchangé si le fichier est absent
+def load_index_constituents(universe, path=INDEX_CONSTITUENTS_PATH):
+    if not os.path.exists(path):
+        return [dict(stock) for stock in universe]
+
+    table = pd.read_csv(path, usecols=["symbol", "shares", "float_factor"]).set_index("symbol")
+    constituents = []
+    for stock in universe:
+        stock = dict(stock)
+        if stock["symbol"] in table.index:
+            row = table.loc[stock["symbol"]]
+            stock["shares"] = float(row["shares"])
+            stock["float_factor"] = float(row["float_factor"])
+        constituents.append(stock)
+    return constituents
+
+
+def cached_index_constituents(universe, path=INDEX_CONSTITUENTS_PATH):
+    return get_shared_cache().get_or_load(
+        ("index_constituents", path, tuple(stock["symbol"] for stock in universe)),
+        lambda: load_index_constituents(universe, path)
+    )
+
+
+class MasiIndex:
+    # Reconstitution du MASI (capitalisation flottante) et des indices sectoriels.
+    # Les constituants sont des dicts au format de MOROCCAN_STOCKS, enrichis
+    # optionnellement de "shares" (nombre de titres) et "float_factor".
+    def __init__(self, constituents, base_level=MASI_BASE_LEVEL):
+        self.base_level = base_level
+        self.symbols = [stock["symbol"] for stock in constituents]
+        self.positions = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        # Secteurs codés en entiers, dans l'ordre d'apparition
+        self.sectors = list(dict.fromkeys(stock["sector"] for stock in constituents))
+        sector_positions = {sector: i for i, sector in enumerate(self.sectors)}
+        self.sector_codes = np.array(
+            [sector_positions[stock["sector"]] for stock in constituents], dtype=np.int64
+        )
+
+        self.prices = np.array([stock["price"] for stock in constituents], dtype=float)
+        # Capitalisations flottantes seulement si tous les constituants ont un nombre de titres;
+        # sinon pondération par les prix pure (titres et flottant ignorés), libellée comme approximation
+        self.capitalisation_weighted = all("shares" in stock for stock in constituents)
+        if self.capitalisation_weighted:
+            self.shares = np.array([stock["shares"] for stock in constituents], dtype=float)
+            self.float_factors = np.array(
+                [stock.get("float_factor", 1.0) for stock in constituents], dtype=float
+            )
+        else:
+            self.shares = np.ones(len(constituents))
+            self.float_factors = np.ones(len(constituents))
+        self.name = "MASI" if self.capitalisation_weighted else "MASI (approx. prix)"
+
+        self.resync()
+        self.divisor = self.total_cap / base_level
+        self.sector_divisors = self.sector_caps / base_level
+
+    # Recalcul complet des capitalisations (utile pour corriger la dérive flottante)
+    def resync(self):
+        self.capitalisations = self.prices * self.shares * self.float_factors
+        self.total_cap = self.capitalisations.sum()
+        self.sector_caps = np.bincount(
+            self.sector_codes, weights=self.capitalisations, minlength=len(self.sectors)
+        )
+
+    @property
+    def level(self):
+        return self.total_cap / self.divisor
+
+    def sector_level(self, sector):
+        code = self.sectors.index(sector)
+        return self.sector_caps[code] / self.sector_divisors[code]
+
+    def sector_levels(self):
+        return dict(zip(self.sectors, self.sector_caps / self.sector_divisors))
+
+    def weights(self):
+        return dict(zip(self.symbols, self.capitalisations / self.total_cap))
+
+    def sector_weights(self):
+        return dict(zip(self.sectors, self.sector_caps / self.total_cap))
+
+    # Mise à jour d'un cours: ajustement O(1) du niveau, sans re-sommation
+    def update_price(self, symbol, price):
+        i = self.positions[symbol]
+        new_cap = price * self.shares[i] * self.float_factors[i]
+        delta = new_cap - self.capitalisations[i]
+
+        self.prices[i] = price
+        self.capitalisations[i] = new_cap
+        self.total_cap += delta
+        self.sector_caps[self.sector_codes[i]] += delta
+        return self.level
+
+    # Opération sur titres (split, augmentation de capital, changement de flottant):
+    # le diviseur est ajusté pour que le niveau de l'indice reste inchangé.
+    def apply_corporate_action(self, symbol, shares=None, float_factor=None, price=None):
+        i = self.positions[symbol]
+        code = self.sector_codes[i]
+        level = self.level
+        sector_level = self.sector_caps[code] / self.sector_divisors[code]
+
+        if shares is not None:
+            self.shares[i] = shares
+        if float_factor is not None:
+            self.float_factors[i] = float_factor
+        if price is not None:
+            self.prices[i] = price
+
+        new_cap = self.prices[i] * self.shares[i] * self.float_factors[i]
+        delta = new_cap - self.capitalisations[i]
+        self.capitalisations[i] = new_cap
+        self.total_cap += delta
+        self.sector_caps[code] += delta
+
+        self.divisor = self.total_cap / level
+        self.sector_divisors[code] = self.sector_caps[code] / sector_level
+        return self.level
+
+    # Série historique de l'indice à partir d'un historique de cours (dates x symboles),
+    # rebasée au niveau de base à la première date
+    def level_series(self, history):
+        prices = history.reindex(columns=self.symbols).ffill().bfill()
+        caps = prices.to_numpy() * (self.shares * self.float_factors)
+        total = np.nansum(caps, axis=1)
+        return pd.Series(self.base_level * total / total[0], index=history.index, name="MASI")
+
+    def sector_series(self, history):
+        prices = history.reindex(columns=self.symbols).ffill().bfill()
+        caps = np.nan_to_num(prices.to_numpy() * (self.shares * self.float_factors))
+        # Somme par secteur: (dates x symboles) @ (symboles x secteurs)
+        membership = np.zeros((len(self.symbols), len(self.sectors)))
+        membership[np.arange(len(self.symbols)), self.sector_codes] = 1.0
+        sector_caps = caps @ membership
+        return pd.DataFrame(
+            self.base_level * sector_caps / sector_caps[0],
+            index=history.index,
+            columns=self.sectors
+        )
+
+
+# Série base 100 du portefeuille chaînée jour après jour (rendement pondéré par le temps).
+# Chaque position n'est comptée qu'à partir de sa date d'achat, entrée au cours du jour.
+def portfolio_index_series(stocks_data, history, base_level=100.0):
+    dates = history.index
+    values = np.zeros(len(dates))
+    flows = np.zeros(len(dates))
+
+    for stock in stocks_data:
+        if stock["symbol"] not in history.columns:
+            continue
+        buy_date = pd.Timestamp(stock.get("buy_date") or dates[0])
+        held = dates >= buy_date
+        prices = np.nan_to_num(history[stock["symbol"]].ffill().bfill().to_numpy())
+        if not held.any():
+            continue
+        start = np.argmax(held)
+        values += np.where(held, stock["quantity"] * prices, 0.0)
+        flows[start] += stock["quantity"] * prices[start]
+
+    invested = np.cumsum(flows) > 0
+    if not invested.any():
+        return pd.Series(dtype=float, name="Portefeuille")
+
+    # Achats en fin de journée: la croissance du jour exclut les nouvelles positions
+    previous_values = np.concatenate([[0.0], values[:-1]])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = np.where(previous_values > 0, (values - flows) / previous_values, 1.0)
+    first = np.argmax(invested)
+    return pd.Series(
+        base_level * np.cumprod(growth[first:]), index=dates[first:], name="Portefeuille"
+    )
+
+
+# Comparaison portefeuille / indice: rendement relatif et beta
+# Aucun résultat si la série du portefeuille ne démarre pas sur une valeur positive.
+def relative_performance(portfolio_values, index_levels):
+    portfolio_values = np.asarray(portfolio_values, dtype=float)
+    index_levels = np.asarray(index_levels, dtype=float)
+    if len(portfolio_values) < 2 or not portfolio_values[0] > 0 or not index_levels[0] > 0:
+        return None
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        portfolio_returns = np.nan_to_num(np.diff(portfolio_values) / portfolio_values[:-1])
+        index_returns = np.nan_to_num(np.diff(index_levels) / index_levels[:-1])
+
+    portfolio_total = portfolio_values[-1] / portfolio_values[0] - 1
+    index_total = index_levels[-1] / index_levels[0] - 1
+
+    index_variance = np.var(index_returns)
+    beta = (
+        np.cov(portfolio_returns, index_returns, ddof=0)[0, 1] / index_variance
+        if len(index_returns) > 1 and index_variance > 0 else None
+    )
+
+    return {
+        "portfolio_return": portfolio_total * 100,
+        "index_return": index_total * 100,
+        "excess_return": (portfolio_total - index_total) * 100,
+        "beta": beta
+    }
@@ -0,0 +1,33 @@
+import os
+import pandas as pd
+
+from shared_cache import get_shared_cache
+
+# Fichier d'historique des cours de clôture (colonnes: date, symbol, close)
+PRICE_HISTORY_PATH = os.environ.get(
+    "PRICE_HISTORY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "historique_cours.csv")
+)
+
+# Fonction pour charger l'historique des cours au format large (dates x symboles)
+def load_price_history(path=PRICE_HISTORY_PATH, symbols=None):
+    if not os.path.exists(path):
+        return None
+
+    history = pd.read_csv(path, parse_dates=["date"])
+    history = history.pivot_table(index="date", columns="symbol", values="close", aggfunc="last")
+    history = history.sort_index().ffill()
+
+    if symbols is not None:
+        history = history.reindex(columns=list(symbols))
+
+    return history
+
+
+# Historique partagé entre sessions via le cache du processus (expire à la clôture)
+def cached_price_history(path=PRICE_HISTORY_PATH, symbols=None):
+    symbols_key = tuple(symbols) if symbols is not None else None
+    return get_shared_cache().get_or_load(
+        ("price_history", path, symbols_key),
+        lambda: load_price_history(path, symbols)
+    )
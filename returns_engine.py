@@ -0,0 +1,190 @@
+import numpy as np
+import pandas as pd
+
+from shared_cache import get_shared_cache
+
+# Paramètres du solveur XIRR (Newton vectorisé avec repli par bissection)
+XIRR_LOWER_BOUND = -0.9999
+XIRR_UPPER_BOUND = 100.0
+XIRR_TOLERANCE = 1e-10
+XIRR_MAX_ITERATIONS = 100
+
+
+# Rendement pondéré par le temps (TWR) pour P portefeuilles sur T dates.
+# values: valeurs de fin de journée (P x T); flows: apports nets de début de journée (P x T).
+def time_weighted_return(values, flows):
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    flows = np.atleast_2d(np.asarray(flows, dtype=float))
+
+    # La base de chaque sous-période est la valeur de la veille plus les apports du jour
+    start_values = np.concatenate([np.zeros((values.shape[0], 1)), values[:, :-1]], axis=1) + flows
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = np.where(start_values > 0, values / start_values, 1.0)
+
+    return np.prod(growth, axis=1) - 1
+
+
+# Taux annuel équivalent d'un rendement cumulé entre deux dates (base 365 jours, comme le XIRR)
+def annualized_return(total_return, start, end):
+    years = (pd.Timestamp(end) - pd.Timestamp(start)).days / 365.0
+    if years <= 0 or total_return <= -1:
+        return None
+    return (1 + total_return) ** (1 / years) - 1
+
+
+def _npv(rates, amounts, times):
+    discount = (1 + rates[:, None]) ** (-times)
+    return (amounts * discount).sum(axis=1)
+
+
+def _npv_derivative(rates, amounts, times):
+    discount = (1 + rates[:, None]) ** (-times - 1)
+    return (-times * amounts * discount).sum(axis=1)
+
+
+# XIRR de P portefeuilles résolus simultanément.
+# amounts et times sont des matrices (P x N) complétées par des zéros; times en années.
+def xirr_batch(amounts, times, guess=0.1):
+    amounts = np.atleast_2d(np.asarray(amounts, dtype=float))
+    times = np.atleast_2d(np.asarray(times, dtype=float))
+    n_portfolios = amounts.shape[0]
+
+    lower = np.full(n_portfolios, XIRR_LOWER_BOUND)
+    upper = np.full(n_portfolios, XIRR_UPPER_BOUND)
+    f_lower = _npv(lower, amounts, times)
+    f_upper = _npv(upper, amounts, times)
+
+    # Sans changement de signe sur l'intervalle, pas de solution
+    solvable = np.sign(f_lower) != np.sign(f_upper)
+    rates = np.full(n_portfolios, guess)
+    active = solvable.copy()
+
+    for _ in range(XIRR_MAX_ITERATIONS):
+        if not active.any():
+            break
+
+        idx = np.flatnonzero(active)
+        r = rates[idx]
+        a = amounts[idx]
+        t = times[idx]
+
+        f = _npv(r, a, t)
+        df = _npv_derivative(r, a, t)
+
+        # Resserrement de l'intervalle autour de la racine
+        same_as_lower = np.sign(f) == np.sign(f_lower[idx])
+        lower[idx] = np.where(same_as_lower, r, lower[idx])
+        f_lower[idx] = np.where(same_as_lower, f, f_lower[idx])
+        upper[idx] = np.where(same_as_lower, upper[idx], r)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = r - f / df
+        midpoint = (lower[idx] + upper[idx]) / 2
+        use_newton = np.isfinite(newton) & (newton > lower[idx]) & (newton < upper[idx])
+        new_r = np.where(use_newton, newton, midpoint)
+
+        rates[idx] = new_r
+        converged = (np.abs(new_r - r) < XIRR_TOLERANCE) | (f == 0)
+        active[idx[converged]] = False
+
+    rates[~solvable] = np.nan
+    return rates
+
+
+# Conversion de flux datés {portefeuille: [(date, montant), ...]} en matrices pour xirr_batch
+def cash_flow_matrices(cash_flows):
+    width = max((len(flows) for flows in cash_flows), default=0)
+    amounts = np.zeros((len(cash_flows), width))
+    times = np.zeros((len(cash_flows), width))
+
+    for i, flows in enumerate(cash_flows):
+        if not flows:
+            continue
+        dates = np.array([np.datetime64(pd.Timestamp(date), "D") for date, _ in flows])
+        amounts[i, :len(flows)] = [amount for _, amount in flows]
+        times[i, :len(flows)] = (dates - dates.min()).astype(float) / 365.0
+
+    return amounts, times
+
+
+# XIRR de nombreux portefeuilles avec cache par (portefeuille, date d'évaluation).
+# Les résultats vont dans le cache partagé (LRU borné, expiration à la clôture).
+# portfolios: {identifiant: [(date, montant), ...]} avec la valeur finale en flux positif.
+def money_weighted_returns(portfolios, as_of):
+    as_of = pd.Timestamp(as_of).normalize()
+    cache = get_shared_cache()
+    results = {}
+    missing = []
+
+    for portfolio_id in portfolios:
+        rate = cache.get(("money_weighted_return", portfolio_id, as_of))
+        if rate is None:
+            missing.append(portfolio_id)
+        else:
+            results[portfolio_id] = rate
+
+    if missing:
+        amounts, times = cash_flow_matrices([portfolios[pid] for pid in missing])
+        rates = xirr_batch(amounts, times)
+        for portfolio_id, rate in zip(missing, rates):
+            results[portfolio_id] = cache.put(("money_weighted_return", portfolio_id, as_of), rate)
+
+    return results
+
+
+# Flux datés d'un portefeuille: achats en flux négatifs, valeur actuelle en flux final
+def portfolio_cash_flows(stocks_data, as_of):
+    flows = [
+        (stock["buy_date"], -stock["quantity"] * stock["buy_price"])
+        for stock in stocks_data
+    ]
+    # Valeur finale: actions détenues (après divisions) et dividendes perçus
+    current_value = sum(
+        stock.get("quantity_held", stock["quantity"]) * stock["current_price"] + stock.get("dividends", 0.0)
+        for stock in stocks_data
+    )
+    flows.append((as_of, current_value))
+    return flows
+
+
+# Identifiant stable d'un portefeuille pour le cache
+def portfolio_key(stocks_data):
+    return tuple(
+        (
+            stock["symbol"], stock["quantity"], stock["buy_price"],
+            stock["current_price"], str(stock["buy_date"]),
+            stock.get("quantity_held"), stock.get("dividends")
+        )
+        for stock in stocks_data
+    )
+
+
+# Valeurs quotidiennes et apports d'un portefeuille à partir de l'historique des cours.
+# factors: facteurs d'ajustement cumulés (dates x symboles) des opérations sur titres.
+def portfolio_value_history(stocks_data, history, factors=None):
+    first_date = min(pd.Timestamp(stock["buy_date"]) for stock in stocks_data)
+    in_range = history.index >= first_date
+    history = history.loc[in_range]
+    if factors is not None:
+        factors = factors.loc[in_range].fillna(1.0)
+    values = np.zeros(len(history))
+    flows = np.zeros(len(history))
+
+    for stock in stocks_data:
+        if stock["symbol"] not in history.columns:
+            continue
+        buy_date = pd.Timestamp(stock["buy_date"])
+        held = history.index >= buy_date
+        prices = history[stock["symbol"]].ffill().to_numpy()
+        if not held.any():
+            continue
+        start = np.argmax(held)
+        # Facteurs rapportés à la date d'achat: la valeur suit les actions réellement détenues
+        scale = np.ones(len(history))
+        if factors is not None:
+            symbol_factors = factors[stock["symbol"]].to_numpy()
+            scale = symbol_factors / symbol_factors[start]
+        values += np.where(held, stock["quantity"] * np.nan_to_num(prices * scale), 0.0)
+        flows[start] += stock["quantity"] * stock["buy_price"]
+
+    return values, flows
@@ -0,0 +1,182 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, time, timedelta
+from types import MappingProxyType
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+# Clôture de la Bourse de Casablanca: les données expirent à la prochaine clôture
+MARKET_TIMEZONE = ZoneInfo("Africa/Casablanca")
+MARKET_CLOSE = time(15, 30)
+
+# Plafond mémoire du cache partagé (Mo), configurable par variable d'environnement
+DEFAULT_MAX_MEMORY_MB = float(os.environ.get("SHARED_CACHE_MAX_MB", "512"))
+
+
+# Prochaine clôture du marché (jours ouvrés uniquement)
+def next_market_close(now=None):
+    now = now or datetime.now(MARKET_TIMEZONE)
+    if now.tzinfo is None:
+        now = now.replace(tzinfo=MARKET_TIMEZONE)
+    close = datetime.combine(now.date(), MARKET_CLOSE, tzinfo=MARKET_TIMEZONE)
+    if now >= close:
+        close += timedelta(days=1)
+    while close.weekday() >= 5:
+        close += timedelta(days=1)
+    return close
+
+
+# Taille mémoire approximative d'une valeur (ou d'une clé) mise en cache, conteneurs parcourus
+def estimate_size(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    # Objets composites (ex. CorporateActions): taille déclarée par l'objet lui-même
+    if hasattr(value, "memory_usage"):
+        return int(value.memory_usage())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, (dict, MappingProxyType)):
+        return sys.getsizeof(value) + sum(
+            estimate_size(key) + estimate_size(item) for key, item in value.items()
+        )
+    return sys.getsizeof(value)
+
+
+def _read_only(values):
+    values = np.array(values, copy=True)
+    values.flags.writeable = False
+    return values
+
+
+# Copie d'un DataFrame ou d'une Series dont chaque colonne numpy est en lecture seule.
+# Les colonnes à dtype d'extension (catégories, dates avec fuseau...) sont simplement copiées.
+def freeze_frame(frame):
+    if isinstance(frame, pd.Series):
+        if not isinstance(frame.dtype, np.dtype):
+            return frame.copy()
+        return pd.Series(_read_only(frame.to_numpy()), index=frame.index, name=frame.name, copy=False)
+    columns = {}
+    for position in range(frame.shape[1]):
+        column = frame.iloc[:, position]
+        columns[position] = _read_only(column.to_numpy()) if isinstance(column.dtype, np.dtype) else column.copy()
+    frozen = pd.DataFrame(columns, index=frame.index, copy=False)
+    frozen.columns = frame.columns
+    return frozen
+
+
+# Les valeurs partagées entre sessions sont verrouillées en lecture seule: tableaux et colonnes
+# des DataFrames non modifiables, listes et dicts convertis en tuples et vues immuables,
+# objets dotés d'une méthode freeze() figés. Une session qui doit modifier fait une copie.
+def _freeze(value):
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (pd.DataFrame, pd.Series)):
+        return freeze_frame(value)
+    elif isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    elif isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    elif hasattr(value, "freeze"):
+        value.freeze()
+    return value
+
+
+class SharedDataCache:
+    # Cache LRU commun à toutes les sessions du processus, avec expiration et plafond mémoire
+    def __init__(self, max_bytes=DEFAULT_MAX_MEMORY_MB * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires_at"] <= datetime.now(MARKET_TIMEZONE):
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["value"]
+
+    def put(self, key, value, expires_at=None):
+        # La clé reste en mémoire avec l'entrée: elle compte dans la taille
+        size = estimate_size(key) + estimate_size(value)
+        value = _freeze(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            # Une valeur plus grande que le plafond n'est pas conservée
+            if size > self.max_bytes:
+                return value
+            self._entries[key] = {
+                "value": value,
+                "size": size,
+                "expires_at": expires_at or next_market_close()
+            }
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return value
+
+    # Lecture avec chargement à la demande; le chargement se fait hors du verrou
+    def get_or_load(self, key, loader, expires_at=None):
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = self.put(key, loader(), expires_at)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry["size"]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "memory_mb": self.total_bytes / 1024 ** 2,
+                "max_memory_mb": self.max_bytes / 1024 ** 2,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+# Instance unique par processus: les modules importés survivent aux reruns Streamlit
+_SHARED_CACHE = SharedDataCache()
+
+
+def get_shared_cache():
+    return _SHARED_CACHE
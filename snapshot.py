@@ -0,0 +1,402 @@
+import argparse
+import json
+import struct
+import time
+import zlib
+from datetime import date
+
+import numpy as np
+
+# Format binaire versionné des instantanés pour le client mobile (petit-boutiste).
+# En-tête: magic, version du format, drapeaux, version de l'instantané, date (jours depuis 1970)
+SNAPSHOT_MAGIC = b"BCSN"
+DELTA_MAGIC = b"BCSD"
+FORMAT_VERSION = 2
+FLAG_COMPRESSED = 0x01
+HEADER = struct.Struct("<4sHBIi")
+DELTA_HEADER = struct.Struct("<4sHBIIi")
+COUNTS = struct.Struct("<HHH")
+DELTA_COUNTS = struct.Struct("<HHHHHH")
+TOTALS = struct.Struct("<dddddfB")
+RISK_LEVELS = ["Faible", "Modéré", "Élevé"]
+EPOCH = date(1970, 1, 1)
+
+# Cours et pourcentages en float32; montants en float64 (précision au centime)
+UNIVERSE_DTYPE = np.dtype([("sector", "<u1"), ("price", "<f4")])
+POSITION_DTYPE = np.dtype([
+    ("symbol", "<u2"),
+    ("quantity", "<f8"),
+    ("value", "<f8"),
+    ("investment", "<f8"),
+    ("pnl", "<f8"),
+    ("pnl_percentage", "<f4"),
+    ("weight", "<f4")
+])
+PRICE_CHANGE_DTYPE = np.dtype([("symbol", "<u2"), ("price", "<f4")])
+SECTOR_CHANGE_DTYPE = np.dtype([("symbol", "<u2"), ("sector", "<u1")])
+
+
+def _encode_strings(strings):
+    parts = []
+    for string in strings:
+        encoded = string.encode("utf-8")
+        parts.append(struct.pack("<B", len(encoded)) + encoded)
+    return b"".join(parts)
+
+
+def _decode_strings(buffer, offset, count):
+    strings = []
+    for _ in range(count):
+        length = buffer[offset]
+        strings.append(bytes(buffer[offset + 1:offset + 1 + length]).decode("utf-8"))
+        offset += 1 + length
+    return strings, offset
+
+
+def _days(as_of):
+    return (as_of - EPOCH).days
+
+
+# Dictionnaires symboles/secteurs dans l'ordre d'apparition de l'univers
+def _dictionaries(universe):
+    symbols = [stock["symbol"] for stock in universe]
+    sectors = list(dict.fromkeys(stock["sector"] for stock in universe))
+    return symbols, sectors
+
+
+# Métriques précédées d'un indicateur de présence: absentes (patch sans mise à jour)
+# et portefeuille vide (aucune position) sont deux cas distincts
+def _encode_metrics(metrics, symbol_codes):
+    if metrics is None:
+        return struct.pack("<B", 0)
+
+    ratios = metrics.get("ratios", {})
+    annual_return = ratios.get("money_weighted_return")
+    risk_level = ratios.get("risk_level")
+    totals = TOTALS.pack(
+        metrics["total_investment"],
+        metrics["current_value"],
+        metrics["pnl"],
+        metrics["pnl_percentage"],
+        metrics.get("dividends", 0.0),
+        np.nan if annual_return is None else annual_return,
+        RISK_LEVELS.index(risk_level) if risk_level in RISK_LEVELS else 255
+    )
+
+    performances = metrics["stock_performances"]
+    positions = np.zeros(len(performances), dtype=POSITION_DTYPE)
+    for i, stock in enumerate(performances):
+        positions[i] = (
+            symbol_codes[stock["symbol"]], stock["quantity"], stock["value"],
+            stock["investment"], stock["pnl"], stock["pnl_percentage"], stock["weight"]
+        )
+    return struct.pack("<BH", 1, len(positions)) + totals + positions.tobytes()
+
+
+def _decode_metrics(buffer, offset, symbols):
+    present = buffer[offset]
+    offset += 1
+    if not present:
+        return None, offset
+    (count,) = struct.unpack_from("<H", buffer, offset)
+    offset += 2
+
+    total_investment, current_value, pnl, pnl_percentage, dividends, annual_return, risk = (
+        TOTALS.unpack_from(buffer, offset)
+    )
+    offset += TOTALS.size
+    positions = np.frombuffer(buffer, dtype=POSITION_DTYPE, count=count, offset=offset)
+    offset += positions.nbytes
+
+    return {
+        "total_investment": total_investment,
+        "current_value": current_value,
+        "pnl": pnl,
+        "pnl_percentage": pnl_percentage,
+        "dividends": dividends,
+        "annual_return": None if np.isnan(annual_return) else float(annual_return),
+        "risk_level": RISK_LEVELS[risk] if risk < len(RISK_LEVELS) else None,
+        "positions": [
+            {
+                "symbol": symbols[position["symbol"]],
+                "quantity": float(position["quantity"]),
+                "value": float(position["value"]),
+                "investment": float(position["investment"]),
+                "pnl": float(position["pnl"]),
+                "pnl_percentage": float(position["pnl_percentage"]),
+                "weight": float(position["weight"])
+            }
+            for position in positions
+        ]
+    }, offset
+
+
+def _wrap(magic_header, payload, compress):
+    flags = FLAG_COMPRESSED if compress else 0
+    body = zlib.compress(payload, 9) if compress else payload
+    return magic_header(flags) + body
+
+
+# Instantané complet: univers (MOROCCAN_STOCKS), derniers cours et métriques du portefeuille
+def encode_snapshot(universe, version, as_of, metrics=None, compress=True):
+    symbols, sectors = _dictionaries(universe)
+    sector_codes = {sector: i for i, sector in enumerate(sectors)}
+    symbol_codes = {symbol: i for i, symbol in enumerate(symbols)}
+
+    arrays = np.zeros(len(universe), dtype=UNIVERSE_DTYPE)
+    arrays["sector"] = [sector_codes[stock["sector"]] for stock in universe]
+    arrays["price"] = [stock["price"] for stock in universe]
+
+    payload = b"".join([
+        COUNTS.pack(len(symbols), len(sectors), 0),
+        _encode_strings(sectors),
+        _encode_strings(symbols),
+        _encode_strings([stock["name"] for stock in universe]),
+        arrays.tobytes(),
+        _encode_metrics(metrics, symbol_codes)
+    ])
+    return _wrap(
+        lambda flags: HEADER.pack(SNAPSHOT_MAGIC, FORMAT_VERSION, flags, version, _days(as_of)),
+        payload,
+        compress
+    )
+
+
+def decode_snapshot(data):
+    magic, format_version, flags, version, days = HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Instantané invalide: en-tête inconnu")
+    if format_version != FORMAT_VERSION:
+        raise ValueError(f"Version de format non supportée: {format_version}")
+
+    body = data[HEADER.size:]
+    payload = memoryview(zlib.decompress(body) if flags & FLAG_COMPRESSED else body)
+    n_symbols, n_sectors, _ = COUNTS.unpack_from(payload)
+    offset = COUNTS.size
+    sectors, offset = _decode_strings(payload, offset, n_sectors)
+    symbols, offset = _decode_strings(payload, offset, n_symbols)
+    names, offset = _decode_strings(payload, offset, n_symbols)
+    arrays = np.frombuffer(payload, dtype=UNIVERSE_DTYPE, count=n_symbols, offset=offset)
+    offset += arrays.nbytes
+    metrics, offset = _decode_metrics(payload, offset, symbols)
+
+    return {
+        "version": version,
+        "as_of": date.fromordinal(EPOCH.toordinal() + days),
+        "symbols": symbols,
+        "names": names,
+        "sectors": sectors,
+        "sector_codes": arrays["sector"].copy(),
+        "prices": arrays["price"].copy(),
+        "metrics": metrics
+    }
+
+
+# Patch entre deux versions: titres retirés et ajoutés, cours, secteurs et noms modifiés,
+# métriques à jour. Les titres conservés gardent leur ordre, les nouveaux sont ajoutés en fin
+# de liste, et les codes du patch désignent les positions dans la nouvelle liste.
+# Si l'ordre des symboles ou le dictionnaire des secteurs change autrement que par ajout,
+# un instantané complet est renvoyé à la place (apply_delta accepte les deux).
+def encode_delta(previous, universe, version, as_of, metrics=None, compress=True):
+    symbols, sectors = _dictionaries(universe)
+    previous_codes = {symbol: i for i, symbol in enumerate(previous["symbols"])}
+    symbol_codes = {symbol: i for i, symbol in enumerate(symbols)}
+    kept = [symbol for symbol in previous["symbols"] if symbol in symbol_codes]
+    new_stocks = [stock for stock in universe if stock["symbol"] not in previous_codes]
+
+    if (
+        symbols != kept + [stock["symbol"] for stock in new_stocks]
+        or sectors[:len(previous["sectors"])] != list(previous["sectors"])
+    ):
+        return encode_snapshot(universe, version, as_of, metrics, compress)
+
+    new_sectors = sectors[len(previous["sectors"]):]
+    sector_codes = {sector: i for i, sector in enumerate(sectors)}
+    removed = np.array(
+        [i for i, symbol in enumerate(previous["symbols"]) if symbol not in symbol_codes], dtype="<u2"
+    )
+
+    new_arrays = np.zeros(len(new_stocks), dtype=UNIVERSE_DTYPE)
+    new_arrays["sector"] = [sector_codes[stock["sector"]] for stock in new_stocks]
+    new_arrays["price"] = [stock["price"] for stock in new_stocks]
+
+    # Titres conservés: comparaison des cours en float32, précision du format
+    price_changes, sector_changes, name_changes = [], [], []
+    for code, stock in enumerate(universe[:len(kept)]):
+        old = previous_codes[stock["symbol"]]
+        if np.float32(stock["price"]) != previous["prices"][old]:
+            price_changes.append((code, stock["price"]))
+        if sector_codes[stock["sector"]] != previous["sector_codes"][old]:
+            sector_changes.append((code, sector_codes[stock["sector"]]))
+        if stock["name"] != previous["names"][old]:
+            name_changes.append((code, stock["name"]))
+    price_changes = np.array(price_changes, dtype=PRICE_CHANGE_DTYPE)
+    sector_changes = np.array(sector_changes, dtype=SECTOR_CHANGE_DTYPE)
+
+    payload = b"".join([
+        DELTA_COUNTS.pack(
+            len(removed), len(new_stocks), len(new_sectors),
+            len(price_changes), len(sector_changes), len(name_changes)
+        ),
+        removed.tobytes(),
+        _encode_strings(new_sectors),
+        _encode_strings([stock["symbol"] for stock in new_stocks]),
+        _encode_strings([stock["name"] for stock in new_stocks]),
+        new_arrays.tobytes(),
+        price_changes.tobytes(),
+        sector_changes.tobytes(),
+        np.array([code for code, _ in name_changes], dtype="<u2").tobytes(),
+        _encode_strings([name for _, name in name_changes]),
+        _encode_metrics(metrics, symbol_codes)
+    ])
+    return _wrap(
+        lambda flags: DELTA_HEADER.pack(
+            DELTA_MAGIC, FORMAT_VERSION, flags, previous["version"], version, _days(as_of)
+        ),
+        payload,
+        compress
+    )
+
+
+def apply_delta(previous, data):
+    # Instantané complet envoyé à la place d'un patch
+    if bytes(data[:len(SNAPSHOT_MAGIC)]) == SNAPSHOT_MAGIC:
+        snapshot = decode_snapshot(data)
+        if snapshot["metrics"] is None:
+            snapshot["metrics"] = previous["metrics"]
+        return snapshot
+
+    magic, format_version, flags, from_version, version, days = DELTA_HEADER.unpack_from(data)
+    if magic != DELTA_MAGIC:
+        raise ValueError("Patch invalide: en-tête inconnu")
+    if format_version != FORMAT_VERSION:
+        raise ValueError(f"Version de format non supportée: {format_version}")
+    if from_version != previous["version"]:
+        raise ValueError(
+            f"Patch prévu pour la version {from_version}, instantané en version {previous['version']}"
+        )
+
+    body = data[DELTA_HEADER.size:]
+    payload = memoryview(zlib.decompress(body) if flags & FLAG_COMPRESSED else body)
+    n_removed, n_new_symbols, n_new_sectors, n_changes, n_sector_changes, n_name_changes = (
+        DELTA_COUNTS.unpack_from(payload)
+    )
+    offset = DELTA_COUNTS.size
+    removed = np.frombuffer(payload, dtype="<u2", count=n_removed, offset=offset)
+    offset += removed.nbytes
+    new_sectors, offset = _decode_strings(payload, offset, n_new_sectors)
+    new_symbols, offset = _decode_strings(payload, offset, n_new_symbols)
+    new_names, offset = _decode_strings(payload, offset, n_new_symbols)
+    new_arrays = np.frombuffer(payload, dtype=UNIVERSE_DTYPE, count=n_new_symbols, offset=offset)
+    offset += new_arrays.nbytes
+    changes = np.frombuffer(payload, dtype=PRICE_CHANGE_DTYPE, count=n_changes, offset=offset)
+    offset += changes.nbytes
+    sector_changes = np.frombuffer(payload, dtype=SECTOR_CHANGE_DTYPE, count=n_sector_changes, offset=offset)
+    offset += sector_changes.nbytes
+    name_codes = np.frombuffer(payload, dtype="<u2", count=n_name_changes, offset=offset)
+    offset += name_codes.nbytes
+    changed_names, offset = _decode_strings(payload, offset, n_name_changes)
+
+    keep = np.ones(len(previous["symbols"]), dtype=bool)
+    keep[removed] = False
+    symbols = [symbol for symbol, kept in zip(previous["symbols"], keep) if kept] + new_symbols
+    names = [name for name, kept in zip(previous["names"], keep) if kept] + new_names
+    for code, name in zip(name_codes, changed_names):
+        names[code] = name
+    sector_codes = np.concatenate([previous["sector_codes"][keep], new_arrays["sector"]])
+    sector_codes[sector_changes["symbol"]] = sector_changes["sector"]
+    prices = np.concatenate([previous["prices"][keep], new_arrays["price"]])
+    prices[changes["symbol"]] = changes["price"]
+    metrics, offset = _decode_metrics(payload, offset, symbols)
+
+    # Sans métriques dans le patch, les précédentes restent valables
+    return {
+        "version": version,
+        "as_of": date.fromordinal(EPOCH.toordinal() + days),
+        "symbols": symbols,
+        "names": names,
+        "sectors": previous["sectors"] + new_sectors,
+        "sector_codes": sector_codes,
+        "prices": prices,
+        "metrics": metrics if metrics is not None else previous["metrics"]
+    }
+
+
+def _synthetic_universe(n_symbols, n_sectors, rng):
+    return [
+        {
+            "symbol": f"S{i:03d}",
+            "name": f"SOCIETE COTEE NUMERO {i}",
+            "price": round(float(rng.uniform(20, 5000)), 2),
+            "sector": f"Secteur {i % n_sectors}"
+        }
+        for i in range(n_symbols)
+    ]
+
+
+def _synthetic_metrics(universe, n_positions, rng):
+    positions = []
+    for stock in universe[:n_positions]:
+        quantity = int(rng.integers(1, 500))
+        investment = quantity * stock["price"] * float(rng.uniform(0.8, 1.2))
+        value = quantity * stock["price"]
+        positions.append({
+            "symbol": stock["symbol"], "quantity": quantity, "value": value,
+            "investment": investment, "pnl": value - investment,
+            "pnl_percentage": (value - investment) / investment * 100, "weight": 0.0
+        })
+    total_investment = sum(p["investment"] for p in positions)
+    current_value = sum(p["value"] for p in positions)
+    return {
+        "total_investment": total_investment,
+        "current_value": current_value,
+        "pnl": current_value - total_investment,
+        "pnl_percentage": (current_value / total_investment - 1) * 100,
+        "stock_performances": positions,
+        "ratios": {"risk_level": "Modéré", "money_weighted_return": 7.5}
+    }
+
+
+def _time(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+# Benchmark taille / temps de décodage sur un univers synthétique de la taille de la cote
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark du format d'instantané mobile")
+    parser.add_argument("--symbols", type=int, default=80)
+    parser.add_argument("--sectors", type=int, default=20)
+    parser.add_argument("--positions", type=int, default=20)
+    parser.add_argument("--changed", type=float, default=0.8, help="Part des cours modifiés par jour")
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    universe = _synthetic_universe(args.symbols, args.sectors, rng)
+    metrics = _synthetic_metrics(universe, args.positions, rng)
+    next_universe = [
+        dict(stock, price=round(stock["price"] * float(rng.uniform(0.95, 1.05)), 2))
+        if rng.random() < args.changed else stock
+        for stock in universe
+    ]
+
+    full = encode_snapshot(universe, 1, date.today(), metrics)
+    raw = encode_snapshot(universe, 1, date.today(), metrics, compress=False)
+    decoded = decode_snapshot(full)
+    delta = encode_delta(decoded, next_universe, 2, date.today(), metrics)
+
+    json_size = len(json.dumps({"universe": universe, "metrics": metrics}).encode("utf-8"))
+
+    print(f"JSON                     : {json_size:>8} octets")
+    print(f"Instantané (non compressé): {len(raw):>8} octets")
+    print(f"Instantané (zlib)        : {len(full):>8} octets")
+    print(f"Patch quotidien          : {len(delta):>8} octets")
+    print(f"Décodage instantané      : {_time(lambda: decode_snapshot(full), args.repeat):>8.3f} ms")
+    print(f"Application du patch     : {_time(lambda: apply_delta(decoded, delta), args.repeat):>8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
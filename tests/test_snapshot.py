@@ -0,0 +1,103 @@
+from datetime import date
+
+import numpy as np
+
+from snapshot import (
+    DELTA_MAGIC,
+    SNAPSHOT_MAGIC,
+    apply_delta,
+    decode_snapshot,
+    encode_delta,
+    encode_snapshot
+)
+
+AS_OF = date(2025, 1, 31)
+
+
+def _stock(symbol, sector, price, name=None):
+    return {"symbol": symbol, "name": name or f"SOCIETE {symbol}", "sector": sector, "price": price}
+
+
+def _metrics(positions):
+    performances = [
+        {
+            "symbol": symbol, "quantity": quantity, "value": quantity * price,
+            "investment": quantity * 10.0, "pnl": quantity * (price - 10.0),
+            "pnl_percentage": (price / 10.0 - 1) * 100, "weight": 0.0
+        }
+        for symbol, quantity, price in positions
+    ]
+    total_investment = sum(p["investment"] for p in performances)
+    current_value = sum(p["value"] for p in performances)
+    return {
+        "total_investment": total_investment,
+        "current_value": current_value,
+        "pnl": current_value - total_investment,
+        "pnl_percentage": 0.0,
+        "stock_performances": performances,
+        "ratios": {"risk_level": "Modéré", "money_weighted_return": None}
+    }
+
+
+def assert_same_state(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, np.ndarray):
+            assert actual[key].dtype == value.dtype
+            np.testing.assert_array_equal(actual[key], value)
+        else:
+            assert actual[key] == value, key
+
+
+# Patch appliqué à l'ancien instantané et instantané complet du nouvel univers
+def round_trip(universe, next_universe, metrics=None, next_metrics=None):
+    previous = decode_snapshot(encode_snapshot(universe, 1, AS_OF, metrics))
+    delta = encode_delta(previous, next_universe, 2, AS_OF, next_metrics)
+    patched = apply_delta(previous, delta)
+    expected = decode_snapshot(encode_snapshot(next_universe, 2, AS_OF, next_metrics))
+    return delta[:4], patched, expected
+
+
+def test_delta_prices_and_new_symbols():
+    universe = [_stock("A", "X", 10.0), _stock("B", "Y", 20.0)]
+    next_universe = [_stock("A", "X", 11.0), _stock("B", "Y", 20.0), _stock("C", "Z", 30.0)]
+    metrics = _metrics([("A", 5, 11.0), ("C", 2, 30.0)])
+    magic, patched, expected = round_trip(universe, next_universe, next_metrics=metrics)
+    assert magic == DELTA_MAGIC
+    assert_same_state(patched, expected)
+
+
+def test_delta_removed_symbol_sector_move_and_rename():
+    universe = [_stock("A", "X", 10.0), _stock("B", "Y", 20.0), _stock("C", "X", 30.0)]
+    next_universe = [_stock("A", "X", 10.0, name="NOUVEAU NOM"), _stock("C", "Y", 31.0)]
+    magic, patched, expected = round_trip(universe, next_universe)
+    assert magic == DELTA_MAGIC
+    assert_same_state(patched, expected)
+    assert patched["symbols"] == ["A", "C"]
+
+
+def test_delta_sector_dictionary_change_falls_back_to_full_snapshot():
+    universe = [_stock("A", "X", 10.0), _stock("B", "Y", 20.0)]
+    next_universe = [_stock("B", "Z", 21.0)]
+    magic, patched, expected = round_trip(universe, next_universe)
+    assert magic == SNAPSHOT_MAGIC
+    assert_same_state(patched, expected)
+    assert patched["symbols"] == ["B"]
+    assert patched["sectors"] == ["Z"]
+
+
+def test_delta_empty_portfolio_clears_positions():
+    universe = [_stock("A", "X", 10.0), _stock("B", "Y", 20.0)]
+    metrics = _metrics([("A", 5, 10.0)])
+    magic, patched, expected = round_trip(universe, universe, metrics, _metrics([]))
+    assert magic == DELTA_MAGIC
+    assert_same_state(patched, expected)
+    assert patched["metrics"]["positions"] == []
+
+
+def test_delta_without_metrics_keeps_previous_metrics():
+    universe = [_stock("A", "X", 10.0)]
+    metrics = _metrics([("A", 5, 10.0)])
+    previous = decode_snapshot(encode_snapshot(universe, 1, AS_OF, metrics))
+    patched = apply_delta(previous, encode_delta(previous, universe, 2, AS_OF))
+    assert patched["metrics"] == previous["metrics"]